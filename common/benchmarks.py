@@ -0,0 +1,21 @@
+import logging
+import time
+
+
+logger = logging.getLogger("slugline.benchmarks")
+
+
+def benchmark(name, fn, repeat=3):
+    """Calls fn repeat times and returns the fastest call in seconds.
+
+    Timings are logged to the slugline.benchmarks logger, which can be enabled through the LOGGING setting to watch for
+    regressions over time.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    logger.info("%s: %.3f ms", name, best * 1000)
+    return best
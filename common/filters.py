@@ -1,9 +1,112 @@
 from django.core.exceptions import FieldError
-from django.db.models import Q
+from django.db.models import F, Q
 from rest_framework import filters
-from common.search_parser import SearchParser
+from rest_framework.exceptions import ValidationError
+from common.search_parser import get_search_parser
 
 from functools import reduce
+import threading
+
+
+class SearchSpec:
+    """
+    The search configuration of a view, compiled once so that requests reuse it rather than rebuilding it. See
+    SearchableFilterBackend for what each argument means.
+    """
+
+    __registry = {}
+    __registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        search_fields=(),
+        search_transformers=None,
+        search_index=None,
+        sort_fields=None,
+    ):
+        self.term_lookups = tuple(field + "__icontains" for field in search_fields)
+        self.transformers = dict(search_transformers or {})
+        self.term_transformer = self.transformers.get("__term")
+        self.search_index = search_index
+        self.sort_fields = {
+            key: tuple(columns) for key, columns in (sort_fields or {}).items()
+        }
+
+    @classmethod
+    def for_view(cls, view):
+        """Returns the spec for a view's class, compiling it on first use."""
+        view_class = type(view)
+        spec = cls.__registry.get(view_class)
+        if spec is None:
+            with cls.__registry_lock:
+                spec = cls.__registry.get(view_class)
+                if spec is None:
+                    spec = cls.__registry[view_class] = cls(
+                        search_fields=getattr(view, "search_fields", ()),
+                        search_transformers=getattr(view, "search_transformers", None),
+                        search_index=getattr(view, "search_index", None),
+                        sort_fields=getattr(view, "sort_fields", None),
+                    )
+        return spec
+
+    def build_query(self, terms, filters):
+        """Returns a Q object for the parsed terms and filters, or None if there is nothing to filter by, and an
+        expression ranking the results, or None if they cannot be ranked.
+        """
+        search_builder = []
+        rank = None
+
+        if self.term_transformer is not None:
+            # Ignore default search fields if we have a transformer for search terms
+            for term in terms:
+                search_builder.append(self.term_transformer(term))
+        elif self.search_index is not None:
+            if len(terms):
+                search_builder.append(self.search_index.search(terms))
+                rank = self.search_index.rank(terms)
+        else:
+            # Search each term in each field
+            for lookup in self.term_lookups:
+                for term in terms:
+                    search_builder.append(Q(**{lookup: term}))
+
+        # Filter results
+        for field, query in filters.items():
+            if field in self.transformers:
+                if isinstance(self.transformers[field], str):
+                    field = self.transformers[field]
+                else:
+                    search_builder.append(self.transformers[field](query[1]))
+                    continue
+            if query[0] == ":":
+                field = field + "__icontains"
+            elif query[0] == "=":
+                field = field + "__iexact"
+            else:
+                # Date range
+                since, until = query
+                if since == ",":
+                    search_builder.append(Q(**{field + "__date__lte": until}))
+                elif until == ",":
+                    search_builder.append(Q(**{field + "__date__gte": since}))
+                else:
+                    search_builder.append(Q(**{field + "__date__range": query}))
+                continue
+            search_builder.append(Q(**{field: query[1]}))
+
+        if not len(search_builder):
+            return None, rank
+        return reduce(lambda acc, f: acc | f, search_builder), rank
+
+    def ordering(self, sort):
+        """Returns the columns to order by for a `sort` parameter, all descending if it starts with "-". Raises
+        ValidationError if the view does not declare the sort.
+        """
+        descending = sort.startswith("-")
+        columns = self.sort_fields.get(sort[1:] if descending else sort)
+        if columns is None:
+            raise ValidationError({"sort": ["SEARCH.SORT.NOT_ALLOWED"]})
+        return ["-" + column if descending else column for column in columns]
 
 
 class SearchableFilterBackend(filters.BaseFilterBackend):
@@ -20,80 +123,72 @@ class SearchableFilterBackend(filters.BaseFilterBackend):
         If the `__term` key is defined in the provided dict, then regular search terms will be transformed with the
         corresponding function, and the search performed on the returned Q object instead of being done through
         `search_fields`.
+    - search_index (optional)
+        A FullTextIndex over the view's model. If provided, regular search terms are looked up in the index instead of
+        being searched for in each of `search_fields`, and results are ordered by relevance unless a sort is given.
+    - sort_fields (optional)
+        A dict where the keys are the values allowed for the `sort` query parameter, and the values are the columns
+        to order by for each. The columns should be covered by an index, so that sorting never has to read the whole
+        table; any other sort is rejected with a 400 response.
+
+    These are compiled into a SearchSpec the first time a view class is filtered.
     """
 
-    __parser = SearchParser()
-    __search_fields = None
-    __search_transformers = None
+    __parser = None
+
+    def __init__(
+        self,
+        search_fields=None,
+        search_transformers=None,
+        search_index=None,
+        sort_fields=None,
+    ):
+        """This constructor is for if we have to initialize the filter manually, instead of from a view's
+        attributes.
+        """
+        self.__spec = None
+        if search_fields is not None or search_transformers is not None:
+            self.__spec = SearchSpec(
+                search_fields=search_fields or (),
+                search_transformers=search_transformers,
+                search_index=search_index,
+                sort_fields=sort_fields,
+            )
+
+    @classmethod
+    def get_parser(cls):
+        """Returns the query parser shared by every instance of this backend, creating it on first use."""
+        if cls.__parser is None:
+            cls.__parser = get_search_parser()
+        return cls.__parser
 
-    def __init__(self, search_fields=None, search_transformers=None):
-        """This constructor is for if we have to initialize the filter manually"""
-        if search_fields is not None:
-            self.__search_fields = map(lambda f: f + "__icontains", search_fields)
-        if search_transformers is not None:
-            self.__search_transformers = search_transformers
+    @classmethod
+    def parser_cache_info(cls):
+        """Returns statistics on the query parse cache."""
+        return cls.get_parser().cache_info()
 
     def filter_queryset(self, request, queryset, view):
         sort = request.query_params.get("sort", None)
         search = request.query_params.get("search", None)
+        spec = self.__spec or SearchSpec.for_view(view)
 
-        # Cache fields and transformers so we don't have to recompute the map every time
-        if self.__search_fields is None:
-            self.__search_fields = map(lambda f: f + "__icontains", view.search_fields)
-        if self.__search_transformers is None:
-            self.__search_transformers = (
-                view.search_transformers if hasattr(view, "search_transformers") else {}
-            )
+        rank = None
 
         if search is not None:
-            parsed_terms, parsed_filters = self.__parser.parse_query(search)
-            search_builder = []
+            parsed_terms, parsed_filters = self.get_parser().parse_query(search)
+            query, rank = spec.build_query(parsed_terms, parsed_filters)
 
-            if "__term" in self.__search_transformers:
-                # Ignore default search fields if we have a transformer for search terms
-                for term in parsed_terms:
-                    search_builder.append(self.__search_transformers["__term"](term))
-            else:
-                # Search each term in each field
-                for field in self.__search_fields:
-                    for term in parsed_terms:
-                        search_builder.append(Q(**{field: term}))
-
-            # Filter results
-            for field, query in parsed_filters.items():
-                if field in self.__search_transformers:
-                    if isinstance(self.__search_transformers[field], str):
-                        field = self.__search_transformers[field]
-                    else:
-                        search_builder.append(
-                            self.__search_transformers[field](query[1])
-                        )
-                        continue
-                if query[0] == ":":
-                    field = field + "__icontains"
-                elif query[0] == "=":
-                    field = field + "__iexact"
-                else:
-                    # Date range
-                    since, until = query
-                    if since == ",":
-                        search_builder.append(Q(**{field + "__date__lte": until}))
-                    elif until == ",":
-                        search_builder.append(Q(**{field + "__date__gte": since}))
-                    else:
-                        search_builder.append(Q(**{field + "__date__range": query}))
-                    continue
-                search_builder.append(Q(**{field: query[1]}))
-
-            if len(search_builder):
+            if query is not None:
                 try:
-                    queryset = queryset.filter(
-                        reduce(lambda acc, f: acc | f, search_builder)
-                    )
+                    queryset = queryset.filter(query)
                 except FieldError:
                     queryset = queryset.none()
 
         if sort is not None:
-            queryset = queryset.order_by(sort)
+            queryset = queryset.order_by(*spec.ordering(sort))
+        elif rank is not None:
+            queryset = queryset.annotate(search_rank=rank).order_by(
+                F("search_rank").desc(nulls_last=True)
+            )
 
         return queryset
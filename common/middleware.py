@@ -0,0 +1,101 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger("slugline.metrics")
+
+_current_metrics = ContextVar("query_metrics", default=None)
+
+
+def current_query_metrics():
+    """Returns the QueryMetrics of the request being handled, or None outside of a request."""
+    return _current_metrics.get()
+
+
+class QueryMetrics:
+    """Counts the SQL queries run while handling a request and the time spent on them, and the time spent serializing
+    and rendering the response. Installed as an execute wrapper on every database connection by QueryMetricsMiddleware.
+
+    Queries run by serializers, e.g. for related objects, count towards both the SQL and serialization times.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.__serializing = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+    @contextmanager
+    def serializing(self):
+        """Times serializing part of the response. Serializers nest, so only the outermost is timed."""
+        self.__serializing += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.__serializing -= 1
+            if not self.__serializing:
+                self.serialize_time += time.perf_counter() - start
+
+    def server_timing(self, total_time):
+        """Returns the metrics formatted as a Server-Timing header."""
+        return ", ".join(
+            [
+                f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f"serialize;dur={self.serialize_time * 1000:.1f}",
+                f"render;dur={self.render_time * 1000:.1f}",
+                f"total;dur={total_time * 1000:.1f}",
+            ]
+        )
+
+
+class QueryMetricsMiddleware:
+    """
+    Records QueryMetrics for each request, available to views and renderers as `request.query_metrics`, and anywhere
+    else through current_query_metrics(). They are logged to the slugline.metrics logger, and when DEBUG is on, sent
+    back in a Server-Timing header so that they show up in the browser's developer tools.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.query_metrics = QueryMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total_time = time.perf_counter() - start
+
+        logger.debug(
+            "%s %s: %d queries in %.1f ms, serialized in %.1f ms, rendered in %.1f ms, %.1f ms total",
+            request.method,
+            request.path,
+            metrics.queries,
+            metrics.sql_time * 1000,
+            metrics.serialize_time * 1000,
+            metrics.render_time * 1000,
+            total_time * 1000,
+        )
+        if settings.DEBUG:
+            response["Server-Timing"] = metrics.server_timing(total_time)
+        return response
@@ -1,7 +1,29 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
 from urllib.parse import urlparse, urlunparse
+import binascii
+import datetime
+import hashlib
+import json
 
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ImproperlyConfigured,
+    ValidationError,
+)
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 def absolute_url_to_relative(url):
@@ -11,7 +33,142 @@ def absolute_url_to_relative(url):
     )
 
 
+COUNT_GENERATION_KEY = "slugline:count:generation"
+
+
+def invalidate_cached_counts(**kwargs):
+    """Forgets every cached count, by moving on to a new generation of cache keys."""
+    try:
+        cache.incr(COUNT_GENERATION_KEY)
+    except ValueError:
+        cache.set(COUNT_GENERATION_KEY, 1, None)
+
+
+def invalidate_counts_on(*models):
+    """Forgets cached counts whenever an instance of one of models is saved or deleted. Bulk operations don't send
+    signals, so their changes show once cached counts time out.
+    """
+    for model in models:
+        post_save.connect(invalidate_cached_counts, sender=model, weak=False)
+        post_delete.connect(invalidate_cached_counts, sender=model, weak=False)
+
+
+def count_queryset(queryset, mode, cap):
+    """Returns the number of rows in queryset and whether that number is an estimate. In "estimated" mode, at most
+    cap rows are counted; on PostgreSQL the planner's estimate is used instead if it is above cap.
+    """
+    if mode == "exact":
+        return queryset.count(), False
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate > cap:
+            return estimate, True
+    count = queryset[: cap + 1].count()
+    if count > cap:
+        return cap, True
+    return count, False
+
+
+class CountedPaginator(Paginator):
+    """A Paginator with a count worked out ahead of time. When the count is an estimate, pages past it can still be
+    requested, and whether there is a next page is found by fetching one extra row.
+    """
+
+    def __init__(self, object_list, per_page, count, estimated=False):
+        super().__init__(object_list, per_page)
+        self.count = count
+        self.estimated = estimated
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            return super().validate_number(number)
+        except EmptyPage as e:
+            if int(number) < 1:
+                raise e
+            return int(number)
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return EstimatedPage(
+            rows[: self.per_page], number, self, len(rows) > self.per_page
+        )
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.__has_next = has_next
+
+    def has_next(self):
+        return self.__has_next
+
+
 class SluglinePagination(PageNumberPagination):
+    """
+    Page number pagination. Requests with a `cursor` query parameter, even an empty one, are paginated with
+    SluglineCursorPagination instead, which stays fast however deep the page.
+
+    Counts can be estimated for views with expensive filters by setting `count_mode = "estimated"` on the view.
+    Views opt into caching their counts per query (see the PAGINATION_COUNT_* settings) by setting `cache_count =
+    True`, which they should only do if every write to the models they list invalidates cached counts; see
+    invalidate_counts_on.
+    """
+
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_pagination = SluglineCursorPagination()
+            return self.cursor_pagination.paginate_queryset(queryset, request, view)
+        self.cursor_pagination = None
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, queryset, page_size):
+        # Stands in for the Paginator class DRF would instantiate, so that the count comes from the cache
+        count, estimated = self.get_count(queryset)
+        return CountedPaginator(queryset, page_size, count, estimated)
+
+    def get_count(self, queryset):
+        """Returns the number of rows in queryset and whether that number is an estimate, from the cache if
+        possible.
+        """
+        mode = getattr(self.view, "count_mode", settings.PAGINATION_COUNT_MODE)
+        cap = settings.PAGINATION_COUNT_CAP
+        if not getattr(self.view, "cache_count", False):
+            return count_queryset(queryset, mode, cap)
+        # The query's SQL identifies everything that filters it, from search terms to the requesting user
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+        except EmptyResultSet:
+            return 0, False
+        digest = hashlib.sha1(f"{mode} {cap} {sql} {params!r}".encode()).hexdigest()
+        key = "slugline:count:{}:{}:{}".format(
+            cache.get(COUNT_GENERATION_KEY, 0), type(self.view).__qualname__, digest
+        )
+
+        cached = cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+        count = count_queryset(queryset, mode, cap)
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
     def get_next_link(self):
         return absolute_url_to_relative(super().get_next_link())
 
@@ -19,9 +176,12 @@ class SluglinePagination(PageNumberPagination):
         return absolute_url_to_relative(super().get_previous_link())
 
     def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
         return Response(
             data={
                 "count": self.page.paginator.count,
+                "count_estimated": self.page.paginator.estimated,
                 "page": self.page.number,
                 "num_pages": self.page.paginator.num_pages,
                 "next": self.get_next_link(),
@@ -29,3 +189,201 @@ class SluglinePagination(PageNumberPagination):
                 "results": data,
             }
         )
+
+
+class CursorEncoder(json.JSONEncoder):
+    # Unlike DjangoJSONEncoder, keep microseconds, as the values must match the database exactly
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        return str(o)
+
+
+class SluglineCursorPagination(BasePagination):
+    """
+    Keyset pagination. Rather than counting and skipping rows, each page is fetched with a predicate on the ordering
+    columns of the last row seen, so with an index over those columns every page costs the same as the first. Views
+    can opt in with `pagination_class`, or any request can with `?cursor=`.
+
+    The queryset's ordering (or its model's default ordering) is used as-is, with the primary key added to break ties.
+    Ordering columns must be fields of the model, or annotations. Nulls are always treated as the smallest value.
+
+    Responses have the same `next`, `previous` and `results` as SluglinePagination, but no counts, as counting is what
+    this avoids.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        values, self.reverse = self.decode_cursor(request)
+        self.ordering = self.get_ordering(queryset)
+
+        queryset = queryset.order_by(
+            *(
+                self.__order_by(name, descending != self.reverse, nullable)
+                for name, descending, nullable in self.ordering
+            )
+        )
+        if values is not None:
+            try:
+                queryset = queryset.filter(self.__after(values))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound("PAGINATION.CURSOR.INVALID")
+
+        page = list(queryset[: self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[: self.page_size]
+        if self.reverse:
+            page.reverse()
+
+        # Moving off either end of a page means there is a page on that side to come back to
+        self.has_next = has_more if not self.reverse else values is not None
+        self.has_previous = has_more if self.reverse else values is not None
+        self.page = page
+        return page
+
+    def get_ordering(self, queryset):
+        """Returns the ordering of queryset as a list of (name, descending, nullable) tuples ending with the primary
+        key. Raises ImproperlyConfigured if an ordering cannot be paginated by keyset.
+        """
+        query = queryset.query
+        if query.order_by:
+            ordering = query.order_by
+        elif query.default_ordering:
+            ordering = query.get_meta().ordering
+        else:
+            ordering = []
+
+        opts = queryset.model._meta
+        result = []
+        for term in ordering:
+            if isinstance(term, str):
+                descending = term.startswith("-")
+                name = term.lstrip("-")
+                nulls_smallest = True
+            elif isinstance(term, OrderBy) and isinstance(term.expression, F):
+                descending = term.descending
+                name = term.expression.name
+                nulls_smallest = (
+                    term.nulls_last if descending else term.nulls_first
+                ) or not (term.nulls_first or term.nulls_last)
+            else:
+                raise ImproperlyConfigured(f"Cannot paginate by cursor on {term!r}")
+
+            if name in query.annotations:
+                nullable = True
+            else:
+                try:
+                    field = opts.pk if name == "pk" else opts.get_field(name)
+                except FieldDoesNotExist:
+                    field = None
+                if field is None or (field.is_relation and name != field.attname):
+                    raise ImproperlyConfigured(
+                        f"Cannot paginate by cursor on {name!r}; order by a column instead"
+                    )
+                if field.primary_key:
+                    name = "pk"
+                nullable = field.null
+            if not nulls_smallest and nullable:
+                raise ImproperlyConfigured(
+                    f"Cannot paginate by cursor on {name!r} unless nulls sort as the smallest values"
+                )
+            result.append((name, descending, nullable))
+            if name == "pk":
+                break
+
+        if not result or result[-1][0] != "pk":
+            # Follow the last column's direction, so that the index can be scanned in one direction
+            result.append(("pk", result[-1][1] if result else False, False))
+        return result
+
+    def decode_cursor(self, request):
+        """Returns the ordering values of the row the page starts after, or None for the first page, and whether
+        the page is before that row rather than after it.
+        """
+        encoded = request.query_params.get(self.cursor_query_param, "")
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            return list(cursor["v"]), bool(cursor["r"])
+        except (binascii.Error, ValueError, UnicodeEncodeError, KeyError, TypeError):
+            raise NotFound("PAGINATION.CURSOR.INVALID")
+
+    def encode_cursor(self, obj, reverse):
+        values = [getattr(obj, name) for name, _, _ in self.ordering]
+        cursor = json.dumps({"v": values, "r": int(reverse)}, cls=CursorEncoder)
+        encoded = urlsafe_b64encode(cursor.encode("ascii")).decode("ascii")
+        return absolute_url_to_relative(
+            replace_query_param(self.base_url, self.cursor_query_param, encoded)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Paged off the end of the results, e.g. after rows were deleted
+            return self.first_page_link()
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.first_page_link()
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def first_page_link(self):
+        return absolute_url_to_relative(
+            replace_query_param(self.base_url, self.cursor_query_param, "")
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            data={
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def __order_by(self, name, descending, nullable):
+        if not nullable:
+            return "-" + name if descending else name
+        # Nulls come first going up and last going down, as the smallest values
+        return (
+            F(name).desc(nulls_last=True)
+            if descending
+            else F(name).asc(nulls_first=True)
+        )
+
+    def __after(self, values):
+        """Returns a Q object matching rows that come after the given ordering values, in the direction being
+        paginated: (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND pk > z), and so on.
+        """
+        if len(values) != len(self.ordering):
+            raise ValueError("Cursor does not match the ordering")
+
+        predicates = []
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.ordering, values):
+            if descending != self.reverse:
+                if value is None:
+                    beyond = Q(pk__in=[])
+                elif nullable:
+                    beyond = Q(**{name + "__lt": value}) | Q(
+                        **{name + "__isnull": True}
+                    )
+                else:
+                    beyond = Q(**{name + "__lt": value})
+            elif value is None:
+                beyond = Q(**{name + "__isnull": False})
+            else:
+                beyond = Q(**{name + "__gt": value})
+            predicates.append(equal & beyond)
+            equal &= (
+                Q(**{name + "__isnull": True}) if value is None else Q(**{name: value})
+            )
+        return reduce(lambda acc, q: acc | q, predicates)
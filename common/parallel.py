@@ -0,0 +1,71 @@
+import atexit
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _start_method():
+    # Forking a process that runs threads can copy locks other threads hold, e.g. logging's, and deadlock the child
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return "forkserver"
+    return "spawn"
+
+
+def _init_worker():
+    # Workers start from a fresh interpreter, which has to load the apps before it can unpickle functions from
+    # modules that import models
+    django.setup()
+
+
+def _shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False)
+        _pools.clear()
+
+
+atexit.register(_shutdown_pools)
+
+
+def get_process_pool(workers):
+    """Returns a process pool with the given number of workers. Pools are created on first use and shared until the
+    process exits, so callers don't pay the cost of starting workers on every call. Workers are started from a fresh
+    interpreter rather than forked, so pools are safe to use from threads.
+    """
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(_start_method()),
+                initializer=_init_worker,
+            )
+        return _pools[workers]
+
+
+def imap_bounded(fn, iterable, workers, window=None):
+    """Like map(fn, iterable), but runs fn across a pool of processes.
+
+    Results are yielded in input order, and at most window (by default twice the number of workers) items are in flight
+    at once, so a large iterable is never held in memory in full. fn and the items must be picklable. With fewer than
+    two workers, fn is simply run in this process.
+    """
+    if workers < 2:
+        yield from map(fn, iterable)
+        return
+
+    pool = get_process_pool(workers)
+    window = window or workers * 2
+    in_flight = deque()
+    for item in iterable:
+        in_flight.append(pool.submit(fn, item))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
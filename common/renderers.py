@@ -1,8 +1,19 @@
 from rest_framework.renderers import JSONRenderer
 
+import time
+
 
 class SluglineRenderer(JSONRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        rendered = self.render_envelope(data, accepted_media_type, renderer_context)
+        # Recorded by QueryMetricsMiddleware
+        metrics = getattr(renderer_context["request"], "query_metrics", None)
+        if metrics is not None:
+            metrics.render_time += time.perf_counter() - start
+        return rendered
+
+    def render_envelope(self, data, accepted_media_type, renderer_context):
         response = renderer_context["response"]
         if response.exception:
             # convert singular detail arguments into arrays
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from functools import reduce
+
+
+class FullTextIndex:
+    """
+    A full-text index over some text columns of a table, which SearchableFilterBackend uses for regular search terms
+    instead of scanning every row with icontains. Views opt in by setting `search_index`.
+
+    The SEARCH_INDEX_BACKEND setting picks how the index is stored:
+
+    - "sqlite"
+        An external-content FTS5 table, kept in sync with the indexed table by triggers, so that saves, bulk inserts
+        and deletes are all reflected. Results are ranked by BM25.
+    - "postgres"
+        A GIN index over a tsvector expression, which PostgreSQL maintains itself. Results are ranked by ts_rank.
+    - "none"
+        No index; terms are searched with icontains on each column, unranked.
+    - "auto" (the default)
+        Whichever of the above fits the database in use.
+
+    The index itself is created by migrations, which keep their own copy of its SQL; see
+    content/migrations/0016_article_search_index.py. Changing the columns or the indexed expression here needs a
+    migration to match.
+    """
+
+    def __init__(self, table, columns, fts_table, config="english"):
+        self.table = table
+        self.columns = list(columns)
+        self.fts_table = fts_table
+        self.config = config
+        self.__installed = {}
+
+    def rebuild(self, using=connection):
+        """Reindexes every row. Only needed if the index was bypassed, e.g. by editing the database by hand."""
+        if self.backend(using) == "sqlite":
+            with using.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')"
+                )
+
+    def backend(self, using=connection):
+        backend = getattr(settings, "SEARCH_INDEX_BACKEND", "auto")
+        if backend != "auto":
+            return backend
+        if using.vendor == "sqlite":
+            # The migration skips creating the index if SQLite was built without FTS5
+            name = using.settings_dict["NAME"]
+            if name not in self.__installed:
+                self.__installed[name] = (
+                    self.fts_table in using.introspection.table_names()
+                )
+            return "sqlite" if self.__installed[name] else "none"
+        elif using.vendor == "postgresql":
+            return "postgres"
+        return "none"
+
+    def search(self, terms):
+        """Returns a Q object matching rows that contain any of the given terms."""
+        terms = [term for term in terms if term]
+        if not terms:
+            # Like icontains with an empty string, match everything
+            return ~Q(pk__in=[])
+
+        backend = self.backend()
+        if backend == "sqlite":
+            return Q(
+                pk__in=RawSQL(
+                    f"SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s",
+                    (self.__sqlite_query(terms),),
+                )
+            )
+        elif backend == "postgres":
+            query, params = self.__postgres_query(terms)
+            return Q(
+                pk__in=RawSQL(
+                    f"SELECT id FROM {self.table} "
+                    f"WHERE {self.__postgres_vector(qualify=False)} @@ {query}",
+                    params,
+                )
+            )
+        return reduce(
+            lambda acc, q: acc | q,
+            (
+                Q(**{column + "__icontains": term})
+                for column in self.columns
+                for term in terms
+            ),
+        )
+
+    def rank(self, terms):
+        """Returns an expression scoring how well each row matches the given terms, higher being better, or None if
+        the backend cannot rank.
+        """
+        terms = [term for term in terms if term]
+        if not terms:
+            return None
+
+        backend = self.backend()
+        if backend == "sqlite":
+            # bm25 scores better matches lower, so negate it
+            return RawSQL(
+                f"SELECT -bm25({self.fts_table}) FROM {self.fts_table} "
+                f'WHERE {self.fts_table} MATCH %s AND rowid = "{self.table}"."id"',
+                (self.__sqlite_query(terms),),
+            )
+        elif backend == "postgres":
+            query, params = self.__postgres_query(terms)
+            return RawSQL(
+                f"ts_rank({self.__postgres_vector(qualify=True)}, {query})", params
+            )
+        return None
+
+    @staticmethod
+    def __sqlite_query(terms):
+        # Quote each term so that FTS5 syntax in user input is taken literally, and match it as a prefix so that
+        # partial words still find results, like they did with icontains
+        return " OR ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def __postgres_vector(self, qualify):
+        # This must be kept identical to the indexed expression for PostgreSQL to use the index
+        prefix = f'"{self.table}".' if qualify else ""
+        document = " || ' ' || ".join(
+            f"coalesce({prefix}{column}, '')" for column in self.columns
+        )
+        return f"to_tsvector('{self.config}', {document})"
+
+    def __postgres_query(self, terms):
+        query = " || ".join(f"plainto_tsquery('{self.config}', %s)" for _ in terms)
+        return f"({query})", terms
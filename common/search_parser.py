@@ -1,8 +1,45 @@
 import pyparsing as pp
+from django.conf import settings
 
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+import re
 
-class SearchParser:
-    def __init__(self):
+
+class BaseSearchParser(ABC):
+    """Parses search queries into a list of regular search terms, and a dict of filters. Subclasses implement the
+    grammar in `_parse`; see SearchParser for its definition.
+    """
+
+    def __init__(self, cache_size=256):
+        """Parsed queries are memoized in an LRU cache of cache_size entries, as a handful of queries tend to make up
+        most searches. A cache_size of None makes the cache unbounded, and 0 disables it.
+        """
+        self.__parse_cached = lru_cache(maxsize=cache_size)(self._parse)
+
+    def parse_query(self, query: str):
+        terms, filters = self.__parse_cached(query)
+        # Hand out copies, so callers can't modify what's in the cache
+        return list(terms), {field: list(value) for field, value in filters}
+
+    def cache_info(self):
+        """Returns the hits, misses, maximum size and current size of the parse cache."""
+        return self.__parse_cached.cache_info()
+
+    def cache_clear(self):
+        self.__parse_cached.cache_clear()
+
+    @abstractmethod
+    def _parse(self, query):
+        """Returns the terms of query as a tuple, and its filters as a tuple of (field, tuple of values) pairs. Raises
+        pyparsing.ParseException if query does not start with a term or filter.
+        """
+
+
+class SearchParser(BaseSearchParser):
+    def __init__(self, cache_size=256):
+        super().__init__(cache_size)
         COLON, EQUAL, COMMA = map(pp.Literal, ":=,")
         SCOLON, SEQUAL, SCOMMA = map(pp.Suppress, ":=,")
         LPAREN, RPAREN = map(pp.Suppress, "()")
@@ -25,9 +62,143 @@ class SearchParser:
 
         self.__expr = query_patt() * (1,)
 
-    def parse_query(self, query: str):
+    def _parse(self, query):
         parsed_query = self.__expr.parseString(query)
-        terms = list(filter(lambda t: isinstance(t, str), parsed_query.asList()))
-        filters = parsed_query.asDict()
+        terms = tuple(filter(lambda t: isinstance(t, str), parsed_query.asList()))
+        filters = tuple(
+            (field, tuple(value)) for field, value in parsed_query.asDict().items()
+        )
 
         return terms, filters
+
+
+class FastSearchParser(BaseSearchParser):
+    """A hand-written parser for exactly the grammar SearchParser builds with pyparsing, down to its quirks, but
+    several times faster. common/test_search_parser.py checks the two agree.
+    """
+
+    # The same tokens pyparsing uses for the grammar
+    WHITESPACE = " \n\t\r"
+    WORD_STRICT = re.compile(r"[^\s'\":=]+")
+    QUOTED_STRINGS = {
+        "'": re.compile(r"'(?:[^'\n\r\\]|(?:\\.))*'"),
+        '"': re.compile(r'"(?:[^"\n\r\\]|(?:\\.))*"'),
+    }
+    ESCAPED_CHAR = re.compile(r"\\(.)")
+    ESCAPED_WHITESPACE = ((r"\t", "\t"), (r"\n", "\n"), (r"\f", "\f"), (r"\r", "\r"))
+    DATE = re.compile(r"(?P<year>\d{4})(?:-(?P<month>\d\d)(?:-(?P<day>\d\d))?)?")
+
+    def _parse(self, query):
+        # pyparsing expands tabs before parsing, unless told otherwise
+        query = query.expandtabs()
+        terms = []
+        filters = {}
+        loc = 0
+        while True:
+            result = self.__filter(query, loc)
+            if result is not None:
+                loc, field, value = result
+                filters[field] = value
+                continue
+            result = self.__word(query, loc)
+            if result is not None:
+                loc, term = result
+                terms.append(term)
+                continue
+            break
+
+        if not terms and not filters:
+            raise pp.ParseException(query, loc, "Expected a search term or filter")
+        return tuple(terms), tuple(filters.items())
+
+    def __skip_whitespace(self, query, loc):
+        while loc < len(query) and query[loc] in self.WHITESPACE:
+            loc += 1
+        return loc
+
+    def __literal(self, query, loc, literal):
+        loc = self.__skip_whitespace(query, loc)
+        return loc + 1 if query.startswith(literal, loc) else None
+
+    def __word(self, query, loc):
+        loc = self.__skip_whitespace(query, loc)
+        if loc >= len(query):
+            return None
+        if query[loc] in self.QUOTED_STRINGS:
+            match = self.QUOTED_STRINGS[query[loc]].match(query, loc)
+            if match is None:
+                return None
+            return match.end(), self.__unquote(match.group()[1:-1])
+        match = self.WORD_STRICT.match(query, loc)
+        return None if match is None else (match.end(), match.group())
+
+    def __unquote(self, string):
+        if "\\" in string:
+            for escape, char in self.ESCAPED_WHITESPACE:
+                string = string.replace(escape, char)
+            string = self.ESCAPED_CHAR.sub(r"\g<1>", string)
+        return string
+
+    def __date(self, query, loc):
+        loc = self.__skip_whitespace(query, loc)
+        match = self.DATE.match(query, loc)
+        if match is None:
+            return None
+        try:
+            return match.end(), datetime.strptime(match.group(), "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+    def __date_range(self, query, loc):
+        loc = self.__literal(query, loc, "(")
+        if loc is None:
+            return None
+
+        value = None
+        since = self.__date(query, loc)
+        if since is not None:
+            comma = self.__literal(query, since[0], ",")
+            until = None if comma is None else self.__date(query, comma)
+            if until is not None:
+                loc, value = until[0], (since[1], until[1])
+        if value is None:
+            comma = self.__literal(query, loc, ",")
+            until = None if comma is None else self.__date(query, comma)
+            if until is not None:
+                loc, value = until[0], (",", until[1])
+        if value is None and since is not None:
+            comma = self.__literal(query, since[0], ",")
+            if comma is not None:
+                loc, value = comma, (since[1], ",")
+        if value is None:
+            return None
+
+        loc = self.__literal(query, loc, ")")
+        return None if loc is None else (loc, value)
+
+    def __filter(self, query, loc):
+        loc = self.__skip_whitespace(query, loc)
+        field = self.WORD_STRICT.match(query, loc)
+        if field is None:
+            return None
+        loc = self.__skip_whitespace(query, field.end())
+        if loc >= len(query) or query[loc] not in ":=":
+            return None
+        delim = query[loc]
+
+        date_range = self.__date_range(query, loc + 1)
+        if date_range is not None:
+            return date_range[0], field.group(), date_range[1]
+        word = self.__word(query, loc + 1)
+        if word is not None:
+            return word[0], field.group(), (delim, word[1])
+        return None
+
+
+def get_search_parser(**kwargs):
+    """Returns a parser of the kind chosen by the SEARCH_PARSER setting: "fast" (the default) for FastSearchParser, or
+    "pyparsing" for SearchParser.
+    """
+    if getattr(settings, "SEARCH_PARSER", "fast") == "pyparsing":
+        return SearchParser(**kwargs)
+    return FastSearchParser(**kwargs)
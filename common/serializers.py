@@ -0,0 +1,12 @@
+from common.middleware import current_query_metrics
+
+
+class TimedSerializerMixin:
+    """Records the time spent serializing in the current request's QueryMetrics, for the Server-Timing header."""
+
+    def to_representation(self, instance):
+        metrics = current_query_metrics()
+        if metrics is None:
+            return super().to_representation(instance)
+        with metrics.serializing():
+            return super().to_representation(instance)
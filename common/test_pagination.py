@@ -0,0 +1,185 @@
+from datetime import date
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from content.models import Article, Issue
+from content.tests import ContentTestCase
+from user.models import SluglineUser
+
+
+class CursorPaginationTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        statuses = [Article.Status.DRAFT, Article.Status.OKAYED]
+        Article.objects.bulk_create(
+            Article(
+                title=f"Article {i}",
+                issue=[self.published_issue, self.unpublished_issue][i % 2],
+                status=statuses[i % 3 % 2],
+            )
+            for i in range(33)
+        )
+        self.c.force_authenticate(self.editor)
+
+    def walk(self, url, params=None, direction="next"):
+        """Follows links from the first page in the given direction, returning the ids on each page."""
+        pages = []
+        response = self.c.get(url, {**(params or {}), "cursor": ""})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([article["id"] for article in response.data["results"]])
+            if response.data[direction] is None:
+                return pages, response
+            response = self.c.get(response.data[direction])
+
+    def test_envelope(self):
+        response = self.c.get("/api/articles/", {"cursor": ""})
+
+        self.assertEqual(list(response.data), ["next", "previous", "results"])
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertIsNone(response.data["previous"])
+
+    def test_pages_through_default_ordering(self):
+        pages, _ = self.walk("/api/articles/")
+
+        self.assertEqual(
+            sum(pages, []),
+            list(Article.objects.order_by("pk").values_list("id", flat=True)),
+        )
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 5])
+
+    def test_pages_through_sorted_columns(self):
+        pages, _ = self.walk("/api/articles/", {"sort": "-issue"})
+
+        self.assertEqual(
+            sum(pages, []),
+            list(
+                Article.objects.order_by(
+                    "-issue_id", "-status", "-date_modified", "-pk"
+                ).values_list("id", flat=True)
+            ),
+        )
+
+    def test_previous_pages_match(self):
+        forward, last = self.walk("/api/articles/", {"sort": "issue"})
+        response = self.c.get(last.data["previous"])
+        backward = []
+        while True:
+            backward.insert(0, [article["id"] for article in response.data["results"]])
+            if response.data["previous"] is None:
+                break
+            response = self.c.get(response.data["previous"])
+
+        self.assertEqual(backward, forward[:-1])
+
+    def test_nullable_columns(self):
+        for code in range(2, 14):
+            Issue.objects.create(
+                volume_num=668,
+                issue_code=str(code),
+                publish_date=date(2020, 1, code) if code % 2 else None,
+            )
+        pages, _ = self.walk("/api/issues/", {"sort": "-publish_date"})
+
+        self.assertEqual(
+            sum(pages, []),
+            list(
+                Issue.objects.order_by(
+                    F("publish_date").desc(nulls_last=True), "-pk"
+                ).values_list("id", flat=True)
+            ),
+        )
+
+    def test_ranked_search(self):
+        pages, _ = self.walk("/api/articles/", {"search": "article"})
+
+        self.assertEqual(len(sum(pages, [])), Article.objects.count())
+
+    def test_page_number_pagination_is_default(self):
+        response = self.c.get("/api/articles/")
+
+        self.assertEqual(response.data["count"], Article.objects.count())
+
+    def test_invalid_cursor(self):
+        for cursor in ("nonsense", "eyJ2IjogWyJ4Il0sICJyIjogMH0="):
+            response = self.c.get("/api/articles/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class PaginationCountTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        Article.objects.bulk_create(
+            Article(title=f"Article {i}", issue=self.published_issue) for i in range(23)
+        )
+        self.c.force_authenticate(self.editor)
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.c.get("/api/articles/", params or {})
+        self.assertEqual(response.status_code, 200)
+        counts = [q for q in queries if q["sql"].startswith("SELECT COUNT(*)")]
+        return response, len(counts)
+
+    def test_counts_are_cached(self):
+        response, counted = self.count_queries()
+        self.assertEqual(counted, 1)
+        self.assertEqual(response.data["count"], 25)
+        self.assertFalse(response.data["count_estimated"])
+
+        response, counted = self.count_queries({"page": 2})
+        self.assertEqual(counted, 0)
+        self.assertEqual(response.data["count"], 25)
+
+    def test_cache_is_keyed_by_query(self):
+        self.count_queries()
+        response, counted = self.count_queries({"search": "is:draft"})
+
+        self.assertEqual(counted, 1)
+        self.assertEqual(response.data["count"], 25)
+
+    def test_writes_invalidate_counts(self):
+        self.count_queries()
+        Article.objects.create(title="Another", issue=self.published_issue)
+        response, counted = self.count_queries()
+
+        self.assertEqual(counted, 1)
+        self.assertEqual(response.data["count"], 26)
+
+    def test_counts_are_only_cached_by_opted_in_views(self):
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.c.get("/api/users/")
+            counts = [q for q in queries if q["sql"].startswith("SELECT COUNT(*)")]
+            self.assertEqual(len(counts), 1)
+
+        SluglineUser.objects.create(username="newcomer")
+        self.assertEqual(
+            self.c.get("/api/users/").data["count"], response.data["count"] + 1
+        )
+
+    @override_settings(PAGINATION_COUNT_MODE="estimated", PAGINATION_COUNT_CAP=12)
+    def test_estimated_counts(self):
+        response, _ = self.count_queries()
+        self.assertEqual(response.data["count"], 12)
+        self.assertTrue(response.data["count_estimated"])
+
+        # Pages past the estimate are still served
+        response, _ = self.count_queries({"page": 2})
+        self.assertIsNotNone(response.data["next"])
+        response, _ = self.count_queries({"page": 3})
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertFalse(response.data["next"])
+        self.assertEqual(self.c.get("/api/articles/", {"page": 4}).status_code, 404)
+
+    @override_settings(PAGINATION_COUNT_MODE="estimated", PAGINATION_COUNT_CAP=100)
+    def test_small_estimated_counts_are_exact(self):
+        response, _ = self.count_queries()
+
+        self.assertEqual(response.data["count"], 25)
+        self.assertFalse(response.data["count_estimated"])
@@ -1,7 +1,10 @@
 from django.test import TestCase
 
-from common.search_parser import SearchParser
+from common.benchmarks import benchmark
+from common.search_parser import FastSearchParser, SearchParser
 from datetime import date
+import pyparsing as pp
+import random
 
 
 class SearchParserTestCase(TestCase):
@@ -49,3 +52,157 @@ class SearchParserTestCase(TestCase):
     def test_things(self):
         for test in self.tests:
             self.assertEqual(self.parser.parse_query(test[0]), test[1])
+
+
+class FastSearchParserTestCase(SearchParserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.parser = FastSearchParser()
+
+
+class SearchParserEquivalenceTestCase(TestCase):
+    """Checks that FastSearchParser parses exactly like the pyparsing grammar it replaces."""
+
+    FRAGMENTS = [
+        "a",
+        "goose",
+        "\U0001F600",
+        " ",
+        "  ",
+        "\t",
+        "\n",
+        "\r",
+        "\xa0",
+        "'",
+        '"',
+        "\\",
+        "\\t",
+        "\\n",
+        "\\'",
+        '\\"',
+        ":",
+        "=",
+        ",",
+        "(",
+        ")",
+        "-",
+        "is:",
+        "title=",
+        "date:(",
+        "2020",
+        "2020-01-01",
+        "2020-06-31",
+        "2020-1-01",
+        "1999-12-31",
+        "20201-01-01",
+    ]
+
+    def setUp(self):
+        self.pyparsing = SearchParser(cache_size=0)
+        self.fast = FastSearchParser(cache_size=0)
+
+    def parse(self, parser, query):
+        try:
+            return parser.parse_query(query)
+        except pp.ParseException:
+            return pp.ParseException
+
+    def assertEquivalent(self, query):
+        self.assertEqual(
+            self.parse(self.fast, query), self.parse(self.pyparsing, query), query
+        )
+
+    def test_edge_cases(self):
+        for query in [
+            "",
+            "   ",
+            "a:b:c",
+            "a==b",
+            "is : me",
+            "is: 'me'",
+            "date: ( 2020-01-01 , 2020-06-01 )",
+            "date:(2020-01-01,2020-06-01",
+            "date:(2020-13-01,)",
+            "date:(2020-01-01,)x",
+            "date:(,)",
+            "a:1 a:2 b:3 a:4",
+            "'unterminated",
+            "ok 'unterminated",
+            "'tab\\t'",
+            "'esc\\\\tape'",
+            "'line\\\nbreak'",
+            "'line\nbreak'",
+            'ab"cd"',
+            "\xa0goose",
+            "goose\xa0goose",
+        ]:
+            self.assertEquivalent(query)
+
+    def test_fuzz(self):
+        rand = random.Random(0)
+        for _ in range(3000):
+            query = "".join(
+                rand.choice(self.FRAGMENTS) for _ in range(rand.randint(1, 12))
+            )
+            self.assertEquivalent(query)
+
+    def test_benchmark_parsers(self):
+        queries = [
+            "hello world",
+            'goose title:"Malice in the Palice" is:okayed',
+            "date:(2020-01-01,2020-06-01) is:editor",
+        ]
+
+        def parse_all(parser):
+            return lambda: [parser.parse_query(query) for query in queries]
+
+        benchmark("search parse (pyparsing)", parse_all(self.pyparsing), repeat=20)
+        benchmark("search parse (fast)", parse_all(self.fast), repeat=20)
+        # Timings are only logged, as they vary too much between machines to assert on
+        self.assertEqual(parse_all(self.fast)(), parse_all(self.pyparsing)())
+
+
+class SearchParserCacheTestCase(TestCase):
+    def setUp(self):
+        self.parser = SearchParser(cache_size=2)
+
+    def test_counts_hits_and_misses(self):
+        self.parser.parse_query("is:okayed")
+        self.parser.parse_query("is:okayed")
+        self.parser.parse_query("is:editor")
+
+        info = self.parser.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+    def test_is_bounded(self):
+        for query in ("a", "b", "c"):
+            self.parser.parse_query(query)
+
+        self.assertEqual(self.parser.cache_info().currsize, 2)
+
+    def test_results_are_not_shared(self):
+        terms, filters = self.parser.parse_query("hello is:okayed")
+        terms.append("world")
+        filters["is"][1] = "rejected"
+
+        self.assertEqual(
+            self.parser.parse_query("hello is:okayed"),
+            (["hello"], {"is": [":", "okayed"]}),
+        )
+
+    def test_benchmark_cold_vs_warm(self):
+        query = (
+            'goose title:"Malice in the Palice" is:okayed date:(2020-01-01,2020-06-01)'
+        )
+
+        def cold():
+            self.parser.cache_clear()
+            self.parser.parse_query(query)
+
+        benchmark("search parse (cold)", cold, repeat=20)
+        benchmark(
+            "search parse (warm)", lambda: self.parser.parse_query(query), repeat=20
+        )
+        # Clearing the cache resets its counts, so only the last cold parse is a miss
+        info = self.parser.cache_info()
+        self.assertEqual((info.hits, info.misses), (20, 1))
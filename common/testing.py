@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Test case mixin for pinning how many queries code may run, so that N+1 queries fail tests."""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=connection):
+        """Fails if more than budget queries run in the block. Unlike assertNumQueries, using fewer passes."""
+        with CaptureQueriesContext(using) as queries:
+            yield queries
+        if len(queries) > budget:
+            self.fail(
+                "{} queries executed, at most {} expected\nCaptured queries were:\n{}".format(
+                    len(queries),
+                    budget,
+                    "\n".join(
+                        f"{i}. {query['sql']}"
+                        for i, query in enumerate(queries.captured_queries, start=1)
+                    ),
+                )
+            )
+
+    def assertQueriesDoNotScale(self, run, grow):
+        """Runs run(), then grow() to add more rows, then run() again, and fails if the second run needed more
+        queries than the first.
+        """
+        with CaptureQueriesContext(connection) as before:
+            run()
+        grow()
+        with self.assertMaxQueries(len(before)):
+            run()
@@ -0,0 +1,238 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+from PIL import Image
+from django.conf import settings
+
+from common.parallel import imap_bounded
+
+try:
+    # Registers AVIF support with versions of Pillow that lack it
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+
+SIZES = [1, 2]
+COLOUR_MODES = {"RGB": "RGB", "LA": "L"}
+MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "avif": "image/avif"}
+
+"""Bump this whenever the rendering code changes its output, so that cached covers are re-rendered."""
+RENDER_VERSION = 2
+
+
+def get_cover_formats():
+    """Returns the formats from COVER_FORMATS that can be encoded here. PNG is always produced."""
+    Image.init()
+    return ["png"] + [
+        fmt
+        for fmt in settings.COVER_FORMATS
+        if fmt != "png" and fmt.upper() in Image.SAVE
+    ]
+
+
+def get_issue_cover_path(issue_path, size, colour, fmt="png"):
+    return issue_path + ".COVER-{}-{}x.{}".format(colour, size, fmt)
+
+
+def get_issue_cover_paths(issue_path, sizes=None, formats=None):
+    """Given a path to an issue, returns the cover image paths. Returns RGB for full colour, and LA for grayscale.
+
+    LA stands for luminosity and alpha; we do not produce an alpha channel, however, and the LA distinction is
+    strictly historical.
+    """
+    if sizes is None:
+        sizes = SIZES
+    if formats is None:
+        formats = ["png"]
+    return [
+        get_issue_cover_path(issue_path, size, colour, fmt)
+        for size in sizes
+        for fmt in formats
+        for colour in COLOUR_MODES
+    ]
+
+
+def get_issue_cover_manifest_path(issue_path):
+    """The manifest records which PDF content and render settings produced the covers next to it."""
+    return issue_path + ".COVER-MANIFEST.json"
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Returns the SHA-256 hex digest of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cover_cache_key(digest, size, colour, fmt):
+    quality = settings.COVER_QUALITY.get(fmt, "")
+    return f"{digest}:{colour}-{size}x:{fmt}{quality}:v{RENDER_VERSION}"
+
+
+def read_cover_manifest(issue_path):
+    try:
+        with open(get_issue_cover_manifest_path(issue_path)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def write_cover_manifest(issue_path, manifest):
+    path = get_issue_cover_manifest_path(issue_path)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    # Atomic, so a crashed render never leaves a manifest vouching for half-written covers
+    os.replace(path + ".tmp", path)
+
+
+def evict_issue_covers(issue_path):
+    """Deletes every cover and the manifest derived from the PDF at issue_path, including covers at sizes that are no
+    longer rendered.
+    """
+    for path in glob.glob(glob.escape(issue_path) + ".COVER-*"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def evict_stale_issue_covers(issue_path):
+    """Evicts the covers of the PDF at issue_path if they were rendered from different content."""
+    digest = read_cover_manifest(issue_path).get("digest")
+    if digest is not None and digest != file_digest(issue_path):
+        evict_issue_covers(issue_path)
+
+
+def render_issue_covers(pdf_path, workers=None):
+    """Rasterizes the first page of the PDF at pdf_path into the images given by get_issue_cover_paths, encoding them
+    across workers processes (by default COVER_ENCODE_PROCESSES).
+
+    Covers already rendered from identical PDF content with the same settings are reused, so this only opens the PDF
+    if some cover is missing or stale. Returns the paths that were rendered.
+    """
+    digest = file_digest(pdf_path)
+    manifest = read_cover_manifest(pdf_path)
+    cached = manifest.get("covers", {}) if manifest.get("digest") == digest else {}
+
+    covers = {}
+    stale = []
+    for size in SIZES:
+        for fmt in get_cover_formats():
+            for colour, mode in COLOUR_MODES.items():
+                path = get_issue_cover_path(pdf_path, size, colour, fmt)
+                key = cover_cache_key(digest, size, colour, fmt)
+                covers[os.path.basename(path)] = key
+                if cached.get(os.path.basename(path)) != key or not os.path.exists(
+                    path
+                ):
+                    stale.append((size, mode, fmt, path))
+
+    if stale:
+        # Rasterize once at the largest size we need, and derive everything else from that
+        largest = max(size for size, _, _, _ in stale)
+        cover = rasterize_cover(pdf_path, largest)
+        scaled = {largest: cover}
+        jobs = []
+        for size, mode, fmt, path in stale:
+            if size not in scaled:
+                scaled[size] = cover.resize(
+                    (
+                        round(cover.width * size / largest),
+                        round(cover.height * size / largest),
+                    ),
+                    Image.LANCZOS,
+                )
+            img = scaled[size]
+            options = {}
+            if fmt in settings.COVER_QUALITY:
+                options["quality"] = settings.COVER_QUALITY[fmt]
+            jobs.append((path, mode, fmt, options, img.size, img.tobytes()))
+        if workers is None:
+            workers = settings.COVER_ENCODE_PROCESSES
+        list(imap_bounded(_encode_cover, jobs, workers=workers))
+
+    if stale or cached != covers:
+        write_cover_manifest(pdf_path, {"digest": digest, "covers": covers})
+    return [path for _, _, _, path in stale]
+
+
+def _accept_quality(accept, media_type):
+    """Returns the quality the Accept header gives media_type, from its most specific matching range."""
+    main_type = media_type.split("/")[0]
+    best = (-1, 0.0)
+    for entry in accept.split(","):
+        accepted, *params = [part.strip() for part in entry.split(";")]
+        specificity = {media_type: 2, main_type + "/*": 1, "*/*": 0}.get(accepted)
+        if specificity is None or specificity < best[0]:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        best = (specificity, quality)
+    return best[1]
+
+
+def negotiate_issue_cover(pdf_path, size, colour, accept):
+    """Picks the rendered cover best matching an Accept header, preferring the smallest format among those accepted
+    with the highest quality. Returns a (path, media type, cache key) tuple, or None if no acceptable cover exists.
+    """
+    covers = read_cover_manifest(pdf_path).get("covers", {})
+    accept = accept or "*/*"
+    candidates = []
+    # get_cover_formats lists PNG first, and later formats compress better
+    for preference, fmt in enumerate(get_cover_formats()):
+        path = get_issue_cover_path(pdf_path, size, colour, fmt)
+        quality = _accept_quality(accept, MEDIA_TYPES[fmt])
+        if quality > 0 and os.path.basename(path) in covers and os.path.exists(path):
+            candidates.append((quality, preference, path, fmt))
+    if not candidates:
+        return None
+    _, _, path, fmt = max(candidates)
+    return path, MEDIA_TYPES[fmt], covers[os.path.basename(path)]
+
+
+def rasterize_cover(pdf_path, size):
+    """Returns the first page of the PDF at pdf_path as an RGB image at the given cover size."""
+    doc = fitz.Document(pdf_path)
+    pix = doc[0].getPixmap(matrix=fitz.Matrix(size / 2, size / 2), alpha=False)
+    # Wrap the raw samples directly rather than round-tripping through an encoded format
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def _encode_cover(job):
+    """Runs in a worker process, so it takes plain picklable data rather than an Image."""
+    path, mode, fmt, options, size, data = job
+    img = Image.frombytes("RGB", size, data)
+    if mode != "RGB":
+        img = img.convert(mode)
+    img.save(path, fmt.upper(), **options)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_render_executor():
+    """Returns the thread pool used to render covers in-process when COVER_RENDER_MODE is "thread"."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.COVER_RENDER_THREADS,
+                thread_name_prefix="cover-render",
+            )
+        return _executor
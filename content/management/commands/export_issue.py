@@ -0,0 +1,40 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from content.models import Issue
+
+
+class Command(BaseCommand):
+    help = "Exports the articles of an issue as a zip archive of InDesign XML"
+
+    def add_arguments(self, parser):
+        parser.add_argument("issue", help="The issue to export, e.g. v145i3")
+        parser.add_argument(
+            "--output",
+            help="Where to write the archive; defaults to the issue's name, e.g. v145i3.zip",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes to render articles across",
+        )
+
+    def handle(self, *args, **options):
+        match = re.fullmatch(r"v([0-9]+)i([0-9A-Z]+)", options["issue"])
+        if match is None:
+            raise CommandError(f"Invalid issue name {options['issue']}")
+        try:
+            issue = Issue.objects.get(
+                volume_num=int(match.group(1)), issue_code=match.group(2)
+            )
+        except Issue.DoesNotExist:
+            raise CommandError(f"Issue {options['issue']} does not exist")
+
+        output = options["output"] or f"{issue}.zip"
+        with open(output, "wb") as f:
+            for chunk in issue.xml_archive(workers=options["workers"]):
+                f.write(chunk)
+        self.stdout.write(f"Exported {issue} to {output}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from content.models import ARTICLE_SEARCH_INDEX
+
+
+class Command(BaseCommand):
+    help = "Reindexes every article for full-text search"
+
+    def handle(self, *args, **options):
+        ARTICLE_SEARCH_INDEX.rebuild()
+        self.stdout.write(f"Rebuilt the {ARTICLE_SEARCH_INDEX.backend()} search index")
@@ -0,0 +1,62 @@
+from datetime import timedelta
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from content.models import Issue, CoverRenderJob
+
+
+class Command(BaseCommand):
+    help = "Renders queued issue covers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for more jobs",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polls of an empty queue",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Seconds after which a running job is assumed to be abandoned and is requeued",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Queue a render for every issue with a PDF before starting",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes to encode each issue's cover images across",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            for issue in Issue.objects.exclude(pdf="").exclude(pdf__isnull=True):
+                CoverRenderJob.objects.enqueue(issue, schedule=False)
+
+        stale_after = timedelta(seconds=options["stale_after"])
+        while True:
+            requeued = CoverRenderJob.objects.requeue_stale(stale_after)
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} abandoned job(s)")
+
+            job = CoverRenderJob.objects.next_pending()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            if job.run(workers=options["workers"]):
+                self.stdout.write(f"{job.issue}: {job.status} {job.error}".rstrip())
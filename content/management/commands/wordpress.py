@@ -1,19 +1,50 @@
 from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.builder import builder_registry
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
 from user.models import SluglineUser
 
+import hashlib
+import json
+import os
 import re
-import copy
+import time
 import xml.etree.ElementTree as ETree
+from collections import defaultdict
+from functools import partial
+from itertools import islice
 
+from common.pagination import invalidate_cached_counts
+from common.parallel import imap_bounded
 from content.models import Issue, Article
+from content.text import html_to_text
 
 """A dictionary of XML namespaces the dump uses.
 """
 XML_NS = {"content": "http://purl.org/rss/1.0/modules/content/"}
 
+"""Bump this whenever normalization changes its output, so that the next sync normalizes every post again."""
+NORMALIZE_VERSION = 3
+
+"""The parsers BeautifulSoup may normalize HTML with. html.parser is built in; lxml is faster, but optional."""
+HTML_PARSERS = ["html.parser", "lxml"]
+
+"""The fields of an article that syncing a changed post updates."""
+SYNCED_FIELDS = [
+    "title",
+    "slug",
+    "author",
+    "content_raw",
+    "content_plain",
+    "issue",
+    "content_hash",
+    "wordpress_guid",
+    "date_modified",
+]
+
 # Taken from https://developer.mozilla.org/en-US/docs/Web/HTML/Block-level_elements
 BLOCK_TAGS = {
     "address",
@@ -49,115 +80,421 @@ BLOCK_TAGS = {
 }
 
 
-class Command(BaseCommand):
-    help = "Import articles from a dump of the WordPress site"
+def iter_items(dump_file):
+    """Yields the <item> elements of a WordPress dump as they are parsed. Each item is removed from the tree once the
+    caller is done with it, so memory use doesn't grow with the size of the dump.
+    """
+    parents = []
+    for event, elem in ETree.iterparse(dump_file, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+        parents.pop()
+        if elem.tag == "item":
+            yield elem
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
 
-    def add_arguments(self, parser):
-        parser.add_argument("dump_file")
 
-    def get_issue_nums(self, issue_name):
-        regex = r"v([0-9]+)i([0-9A-Z]+)"
-        match = re.match(regex, issue_name)
-        if match:
-            return int(match.group(1)), match.group(2)
-        else:
-            return None
+def batched(iterable, size):
+    """Yields lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
-    def is_block_element(self, elem):
-        """Returns true if tag is a block-level element in HTML."""
-        if isinstance(elem, NavigableString):
-            return False
-        else:
-            return elem.name in BLOCK_TAGS
 
-    def parse_wordpress_html(self, content):
-        """Reads in raw HTML from a Wordpress dump and does some
-        post-processing to add paragraph breaks and attempt to
-        extract the author name.
-        """
-        content_soup = BeautifulSoup(content, features="html.parser")
-        new_soup = BeautifulSoup(features="html.parser")
-        for elem in content_soup.children:
-            if isinstance(elem, NavigableString):
-                # Split on double new lines to form paragraphs
-                paras = str(elem).split("\n\n")
-                # If the last element in the new tree is a <p> and its last child is inline
-                # then the current paragraph was broken by that inline element and we have
-                # to put it back together.
-                try:
-                    if new_soup.contents[-1].name == "p" and not self.is_block_element(
-                        new_soup.contents[-1].contents[-1]
-                    ):
+def get_issue_nums(issue_name):
+    regex = r"v([0-9]+)i([0-9A-Z]+)"
+    match = re.match(regex, issue_name)
+    if match:
+        return int(match.group(1)), match.group(2)
+    else:
+        return None
+
+
+def is_block_element(elem):
+    """Returns true if tag is a block-level element in HTML."""
+    if isinstance(elem, NavigableString):
+        return False
+    else:
+        return elem.name in BLOCK_TAGS
+
+
+def parse_fragment(content, parser):
+    """Parses an HTML fragment, returning the tag whose children are its top-level nodes."""
+    if parser == "html.parser":
+        return BeautifulSoup(content, features=parser)
+    # Other parsers build a whole document, and wrap text directly in <body> in a <p>, which would hide the paragraphs
+    # we split text into. Text in a <div> is left alone.
+    soup = BeautifulSoup(f"<div>{content}</div>", features=parser)
+    soup.body.div.unwrap()
+    return soup.body
+
+
+def parse_wordpress_html(content, parser="html.parser"):
+    """Reads in raw HTML from a Wordpress dump and does some
+    post-processing to add paragraph breaks and attempt to
+    extract the author name.
+
+    The HTML is returned without the whitespace prettify() would add, which only takes up space.
+    """
+    content_soup = parse_fragment(content, parser)
+    new_soup = BeautifulSoup(features="html.parser")
+    # The parsed content is thrown away, so its nodes are moved rather than copied
+    for elem in list(content_soup.children):
+        if isinstance(elem, NavigableString):
+            # Split on double new lines to form paragraphs
+            paras = str(elem).split("\n\n")
+            # The last paragraph may go on with an inline element, which has to stay a word apart. Without
+            # prettify()'s line breaks, stripping that space would join them.
+            following = elem.next_sibling
+            inline_follows = following is not None and not is_block_element(following)
+            # If the last element in the new tree is a <p> and its last child is inline
+            # then the current paragraph was broken by that inline element and we have
+            # to put it back together.
+            try:
+                if new_soup.contents[-1].name == "p" and not is_block_element(
+                    new_soup.contents[-1].contents[-1]
+                ):
+                    if len(paras) == 1 and inline_follows:
                         new_soup.contents[-1].append(paras[0])
-                        paras = paras[1:]
-                except IndexError:
-                    # either new_soup has no children, or the last element in new_soup
-                    # has no children, so forget about it
-                    pass
-                for para in paras:
-                    p_tag = new_soup.new_tag("p")
+                    else:
+                        new_soup.contents[-1].append(paras[0].rstrip())
+                    paras = paras[1:]
+            except IndexError:
+                # either new_soup has no children, or the last element in new_soup
+                # has no children, so forget about it
+                pass
+            for i, para in enumerate(paras):
+                p_tag = new_soup.new_tag("p")
+                if i == len(paras) - 1 and inline_follows:
+                    p_tag.string = re.sub(r"\s+$", " ", para.lstrip())
+                else:
                     p_tag.string = para.strip()
-                    new_soup.append(p_tag)
-            elif self.is_block_element(elem):
-                new_soup.append(copy.copy(elem))
+                new_soup.append(p_tag)
+        elif is_block_element(elem):
+            new_soup.append(elem.extract())
+        else:
+            if len(new_soup.contents) == 0:
+                p_tag = new_soup.new_tag("p")
+                p_tag.append(elem.extract())
+                new_soup.append(p_tag)
             else:
-                if len(new_soup.contents) == 0:
-                    p_tag = new_soup.new_tag("p")
-                    p_tag.append(copy.copy(elem))
-                    new_soup.append(p_tag)
-                else:
-                    new_soup.contents[-1].append(copy.copy(elem))
-        author_tag = new_soup.contents[-1].extract()
-        return new_soup.prettify(), author_tag.text
-
-    def article_from_tag(self, article_tag, user):
-        title = article_tag.find("title").text or ""
-        content = article_tag.find("content:encoded", XML_NS).text
-        post_tags = article_tag.findall(r'.//category[@domain="post_tag"]')
-        # Loop through all the tags until we find one that matches a version number
-        volume_num = None
-        issue_code = None
-        for tag in post_tags:
-            issue_name = tag.text
-            result = self.get_issue_nums(issue_name)
-            if result != None:
-                volume_num, issue_code = result
-                break
-        if issue_code == None or volume_num == None:
-            # this doesn't have a valid issue tag, forget about it
-            return None
-        issue, _ = Issue.objects.get_or_create(
-            issue_code=issue_code, volume_num=volume_num
-        )
+                new_soup.contents[-1].append(elem.extract())
+    author_tag = new_soup.contents[-1].extract()
+    return new_soup.decode(), author_tag.text
+
+
+def get_post_issue_nums(item):
+    """Returns the volume number and issue code from the first issue tag of an <item>, or None if it has none."""
+    post_tags = item.findall(r'.//category[@domain="post_tag"]')
+    # Loop through all the tags until we find one that matches a version number
+    for tag in post_tags:
+        result = get_issue_nums(tag.text or "")
+        if result is not None:
+            return result
+    return None
+
+
+def scan_issues(dump_file):
+    """Returns the (volume_num, issue_code) pairs of every issue the posts in a dump belong to."""
+    issues = set()
+    for item in iter_items(dump_file):
+        result = get_post_issue_nums(item)
+        if result is not None:
+            issues.add(result)
+    return issues
+
+
+def read_post(item):
+    """Returns the fields of an <item> that importing it needs, as a dict that can be sent to other processes, or None
+    if it doesn't have an issue tag.
+    """
+    result = get_post_issue_nums(item)
+    if result is None:
+        # this doesn't have a valid issue tag, forget about it
+        return None
+    volume_num, issue_code = result
+    post = {
+        "guid": (item.findtext("guid") or "").strip() or None,
+        "title": item.findtext("title") or "",
+        "content": item.findtext("content:encoded", "", XML_NS),
+        "volume_num": volume_num,
+        "issue_code": issue_code,
+    }
+    post["hash"] = post_hash(post)
+    return post
+
+
+def post_hash(post):
+    """Returns a hash of everything an article is imported from, to tell whether a post changed since it was."""
+    data = json.dumps(
+        [
+            NORMALIZE_VERSION,
+            post["title"],
+            post["content"],
+            post["volume_num"],
+            post["issue_code"],
+        ]
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def checkpoint_key(dump_file):
+    """Identifies a version of a dump, so that a checkpoint isn't used to resume syncing a different one."""
+    stat = os.stat(dump_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def read_checkpoint(path, dump_file):
+    """Returns how many items of dump_file an interrupted sync got through, according to the checkpoint at path, or 0
+    if there is no checkpoint for this dump.
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if not isinstance(checkpoint, dict) or checkpoint.get("dump") != checkpoint_key(
+        dump_file
+    ):
+        return 0
+    position = checkpoint.get("position")
+    return position if isinstance(position, int) else 0
+
+
+def write_checkpoint(path, dump_file, position):
+    with open(path + ".tmp", "w") as f:
+        json.dump({"dump": checkpoint_key(dump_file), "position": position}, f)
+    # Atomic, so an interrupted sync never leaves a half-written checkpoint
+    os.replace(path + ".tmp", path)
+
+
+def normalize_post(post, parser="html.parser"):
+    """Adds the normalized HTML of a post, its author and its plain text to a post from read_post. This is the slow
+    part of an import, so it runs in worker processes. If the post can't be normalized, the error is added instead.
+    """
+    try:
         # get rid of the mysterious &nbsp's Wordpress insists on putting everywhere
-        content = content.replace("&nbsp;", " ").strip()
-        content_html, author = self.parse_wordpress_html(content)
-        return Article(
-            title=title,
-            slug=slugify(title),
+        content = post["content"].replace("&nbsp;", " ").strip()
+        content_html, author = parse_wordpress_html(content, parser)
+        post.update(
+            content_html=content_html,
             author=author,
+            content_plain=html_to_text(content_html),
+        )
+    except Exception as e:
+        post["error"] = f"{type(e).__name__}: {e}"
+    return post
+
+
+class Command(BaseCommand):
+    help = "Import articles from a dump of the WordPress site"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dump_file")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Update the articles of posts that changed and add new ones, instead of deleting every WordPress "
+            "article and importing them again. Interrupted syncs resume where they stopped.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Where --sync records its progress; defaults to the dump file with .checkpoint appended",
+        )
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Don't ask for confirmation before deleting existing WordPress articles",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Articles to write to the database in each transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes to normalize article HTML across",
+        )
+        parser.add_argument(
+            "--html-parser",
+            choices=HTML_PARSERS,
+            default="html.parser",
+            help="The parser to normalize article HTML with. lxml is faster, but has to be installed separately.",
+        )
+
+    def article_from_post(self, post, user):
+        issue = self.issues[post["volume_num"], post["issue_code"]]
+        return Article(
+            pk=post.get("pk"),
+            title=post["title"],
+            slug=slugify(post["title"]),
+            author=post["author"],
             article_type=Article.Type.WORDPRESS,
-            content_raw=content_html,
+            content_raw=post["content_html"],
+            content_plain=post["content_plain"],
             issue=issue,
             user=user,
+            wordpress_guid=post["guid"],
+            content_hash=post["hash"],
+            # bulk_update doesn't set this for us
+            date_modified=timezone.now(),
         )
 
     def handle(self, *args, **options):
-        self.stdout.write("WARNING: This will delete all existing Wordpress articles!")
-        self.stdout.write("Backup the database before continuing.")
-        input("Press ENTER to continue...")
+        if builder_registry.lookup(options["html_parser"]) is None:
+            raise CommandError(f"The {options['html_parser']} parser is not installed")
+        self.sync = options["sync"]
+        if not self.sync:
+            self.stdout.write(
+                "WARNING: This will delete all existing Wordpress articles!"
+            )
+            self.stdout.write("Backup the database before continuing.")
+            if options["interactive"]:
+                input("Press ENTER to continue...")
         # Check if an admin user exists
         try:
             user = SluglineUser.objects.get(username="admin", is_superuser=True)
         except SluglineUser.DoesNotExist:
             self.stdout.write("No admin superuser found. Create one first.")
             return
-        # Delete existing Wordpress articles
-        Article.objects.filter(article_type=Article.Type.WORDPRESS).delete()
-        file_name = options["dump_file"]
-        tree = ETree.parse(file_name)
-        article_tags = tree.findall(".//item")
-        articles = filter(
-            None, map(lambda tag: self.article_from_tag(tag, user), article_tags)
+
+        dump_file = options["dump_file"]
+        checkpoint = options["checkpoint"] or dump_file + ".checkpoint"
+        start = 0
+        if self.sync:
+            start = read_checkpoint(checkpoint, dump_file)
+            if start:
+                self.stdout.write(f"Resuming from item {start}")
+            # Only what tells articles apart and whether they changed is held in memory
+            self.existing = {
+                guid: (pk, content_hash)
+                for guid, pk, content_hash in Article.objects.filter(
+                    wordpress_guid__isnull=False
+                ).values_list("wordpress_guid", "pk", "content_hash")
+            }
+            # Articles imported before GUIDs were kept are matched by issue and slug instead, and get their GUIDs
+            # the first time they are synced
+            self.legacy = defaultdict(list)
+            for issue_id, slug, pk in (
+                Article.objects.filter(
+                    article_type=Article.Type.WORDPRESS, wordpress_guid__isnull=True
+                )
+                .order_by("pk")
+                .values_list("issue_id", "slug", "pk")
+            ):
+                self.legacy[issue_id, slug].append(pk)
+        else:
+            # Delete existing Wordpress articles
+            Article.objects.filter(article_type=Article.Type.WORDPRESS).delete()
+            self.existing = {}
+            self.legacy = {}
+
+        self.seen_guids = set()
+        self.created = self.updated = self.unchanged = self.skipped = 0
+        self.start_time = time.perf_counter()
+        # Look up every issue at once, rather than once for each article
+        self.issues = Issue.objects.resolve(scan_issues(dump_file))
+        self.stdout.write(f"Found {len(self.issues)} issues in {self.elapsed():.1f}s")
+
+        items = islice(enumerate(iter_items(dump_file)), start, None)
+        posts = (self.read_post(position, item) for position, item in items)
+        posts = filter(self.is_changed, filter(None, posts))
+        # Posts come back in order, and only a few at a time are in flight, so the dump is still streamed
+        normalize = partial(normalize_post, parser=options["html_parser"])
+        posts = imap_bounded(normalize, posts, workers=options["workers"])
+        for batch in batched(posts, options["batch_size"]):
+            articles = [self.build_article(post, user) for post in batch]
+            self.write_articles([article for article in articles if article])
+            if self.sync:
+                write_checkpoint(checkpoint, dump_file, batch[-1]["position"] + 1)
+            self.report_progress()
+
+        if self.sync and os.path.exists(checkpoint):
+            # Finished, so the next sync starts from the beginning
+            os.remove(checkpoint)
+        # Bulk writes don't send the signals that would do this
+        invalidate_cached_counts()
+        self.stdout.write(
+            f"Imported {self.created + self.updated} articles ({self.created} new, {self.updated} changed), "
+            f"{self.unchanged} unchanged, skipped {self.skipped} items in {self.elapsed():.1f}s"
         )
-        Article.objects.bulk_create(articles)
+
+    def read_post(self, position, item):
+        post = read_post(item)
+        if post is None:
+            self.skipped += 1
+            return None
+        post["position"] = position
+        guid = post["guid"]
+        if guid is None:
+            if self.sync:
+                self.skip(post, "it has no GUID to sync it by")
+                return None
+        elif guid in self.seen_guids:
+            self.skip(post, f"duplicate GUID {guid}")
+            return None
+        else:
+            self.seen_guids.add(guid)
+        return post
+
+    def is_changed(self, post):
+        """Returns whether a post is new or has changed since it was imported, noting which article it updates."""
+        existing = self.existing.get(post["guid"])
+        if existing is None:
+            issue = self.issues.get((post["volume_num"], post["issue_code"]))
+            legacy = issue and self.legacy.get((issue.pk, slugify(post["title"])))
+            if legacy:
+                post["pk"] = legacy.pop(0)
+            return True
+        post["pk"], content_hash = existing
+        if content_hash == post["hash"]:
+            self.unchanged += 1
+            return False
+        return True
+
+    def build_article(self, post, user):
+        """Returns the article for a normalized post, or None if it is skipped. A post that can't be imported is
+        reported rather than ending the import.
+        """
+        if "error" in post:
+            self.skip(post, post["error"])
+            return None
+        try:
+            return self.article_from_post(post, user)
+        except Exception as e:
+            self.skip(post, f"{type(e).__name__}: {e}")
+            return None
+
+    def write_articles(self, articles):
+        created = [article for article in articles if article.pk is None]
+        updated = [article for article in articles if article.pk is not None]
+        # Batches that were written stay written if a later one fails
+        with transaction.atomic():
+            Article.objects.bulk_create(created)
+            Article.objects.bulk_update(updated, SYNCED_FIELDS)
+        self.created += len(created)
+        self.updated += len(updated)
+
+    def skip(self, post, error):
+        self.stderr.write(f"Skipping item {post['title']!r}: {error}")
+        self.skipped += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def report_progress(self):
+        written = self.created + self.updated
+        elapsed = self.elapsed()
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(f"Imported {written} articles ({rate:.0f}/s)")
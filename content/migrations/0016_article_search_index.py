@@ -0,0 +1,76 @@
+from django.db import migrations
+
+
+# The SQL of common.search_index.FullTextIndex as of this migration, copied so that later changes to it don't change
+# what this migration does
+FTS_TABLE = "content_article_fts"
+COLUMNS = ["title", "content_raw"]
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        if not sqlite_has_fts5(schema_editor.connection):
+            return
+        columns = ", ".join(COLUMNS)
+        new_values = ", ".join(f"new.{c}" for c in COLUMNS)
+        old_values = ", ".join(f"old.{c}" for c in COLUMNS)
+        delete_old = (
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values});"
+        )
+        insert_new = (
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, content='content_article', content_rowid='id')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON content_article "
+            f"BEGIN {insert_new} END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON content_article "
+            f"BEGIN {delete_old} END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON content_article "
+            f"BEGIN {delete_old} {insert_new} END"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+    elif vendor == "postgresql":
+        document = " || ' ' || ".join(f"coalesce({c}, '')" for c in COLUMNS)
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {FTS_TABLE}_idx ON content_article "
+            f"USING GIN ((to_tsvector('english', {document})))"
+        )
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for trigger in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {FTS_TABLE}_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0015_coverrenderjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,168 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:22
+
+import json
+from html.parser import HTMLParser
+
+from django.db import migrations, models
+
+
+# The SQL of common.search_index.FullTextIndex and the text extraction of content.text as of this migration, copied
+# so that later changes to them don't change what this migration does
+FTS_TABLE = "content_article_fts"
+OLD_COLUMNS = ["title", "content_raw"]
+NEW_COLUMNS = ["title", "content_plain"]
+INVISIBLE_TAGS = {"script", "style", "template"}
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.invisible_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in INVISIBLE_TAGS:
+            self.invisible_depth += 1
+        self.chunks.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in INVISIBLE_TAGS and self.invisible_depth:
+            self.invisible_depth -= 1
+        self.chunks.append(" ")
+
+    def handle_data(self, data):
+        if not self.invisible_depth:
+            self.chunks.append(data)
+
+
+def html_to_text(html):
+    extractor = TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return " ".join("".join(extractor.chunks).split())
+
+
+def slate_to_text(content):
+    try:
+        nodes = json.loads(content)
+    except ValueError:
+        return " ".join(content.split())
+
+    chunks = []
+    stack = [nodes]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if isinstance(node.get("text"), str):
+                chunks.append(node["text"])
+            else:
+                chunks.append(" ")
+                stack.append(node.get("children", []))
+        elif isinstance(node, str):
+            chunks.append(node)
+    return " ".join("".join(chunks).split())
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def install_index(schema_editor, columns):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        if not sqlite_has_fts5(schema_editor.connection):
+            return
+        names = ", ".join(columns)
+        new_values = ", ".join(f"new.{c}" for c in columns)
+        old_values = ", ".join(f"old.{c}" for c in columns)
+        delete_old = (
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {names}) "
+            f"VALUES ('delete', old.id, {old_values});"
+        )
+        insert_new = (
+            f"INSERT INTO {FTS_TABLE}(rowid, {names}) VALUES (new.id, {new_values});"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{names}, content='content_article', content_rowid='id')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON content_article "
+            f"BEGIN {insert_new} END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON content_article "
+            f"BEGIN {delete_old} END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON content_article "
+            f"BEGIN {delete_old} {insert_new} END"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+    elif vendor == "postgresql":
+        document = " || ' ' || ".join(f"coalesce({c}, '')" for c in columns)
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {FTS_TABLE}_idx ON content_article "
+            f"USING GIN ((to_tsvector('english', {document})))"
+        )
+
+
+def uninstall_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for trigger in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {FTS_TABLE}_idx")
+
+
+def fill_content_plain(apps, schema_editor):
+    Article = apps.get_model("content", "Article")
+    articles = Article.objects.only("article_type", "content_raw")
+    for article in articles.iterator():
+        if article.article_type == "wordpress":
+            article.content_plain = html_to_text(article.content_raw)
+        else:
+            article.content_plain = slate_to_text(article.content_raw)
+        article.save(update_fields=["content_plain"])
+
+
+def uninstall_old_index(apps, schema_editor):
+    uninstall_index(schema_editor)
+
+
+def install_old_index(apps, schema_editor):
+    install_index(schema_editor, OLD_COLUMNS)
+
+
+def uninstall_new_index(apps, schema_editor):
+    uninstall_index(schema_editor)
+
+
+def install_new_index(apps, schema_editor):
+    install_index(schema_editor, NEW_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0016_article_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_old_index, install_old_index),
+        migrations.AddField(
+            model_name="article",
+            name="content_plain",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(fill_content_plain, migrations.RunPython.noop),
+        migrations.RunPython(install_new_index, uninstall_new_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0017_article_content_plain"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["issue", "status", "date_modified"],
+                name="article_issue_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["user", "date_created"], name="article_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(fields=["publish_date"], name="issue_publish_date_idx"),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+# The SQL of common.search_index.FullTextIndex as of this migration, copied so that later changes to it don't change
+# what this migration does
+FTS_TABLE = "content_article_fts"
+COLUMNS = ["title", "content_plain"]
+
+
+def sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding or removing a unique column remakes the table on SQLite, which drops the index's triggers. PostgreSQL
+    # keeps its index, so there is nothing to do there
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    if not sqlite_has_fts5(schema_editor.connection):
+        return
+    columns = ", ".join(COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in COLUMNS)
+    delete_old = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = (
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+    )
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='content_article', content_rowid='id')"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON content_article "
+        f"BEGIN {insert_new} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON content_article "
+        f"BEGIN {delete_old} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON content_article "
+        f"BEGIN {delete_old} {insert_new} END"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0018_article_issue_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name="article",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="wordpress_guid",
+            field=models.CharField(
+                blank=True, editable=False, max_length=255, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
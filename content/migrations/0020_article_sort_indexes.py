@@ -0,0 +1,35 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0019_article_wordpress_guid"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["title"], name="article_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["date_created"], name="article_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["date_modified"], name="article_modified_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(fields=["user", "title"], name="article_user_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["user", "date_modified"], name="article_user_modified_idx"
+            ),
+        ),
+    ]
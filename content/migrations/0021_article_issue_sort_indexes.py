@@ -0,0 +1,25 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0020_article_sort_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["issue", "title"], name="article_issue_title_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["issue", "date_modified"], name="article_issue_modified_idx"
+            ),
+        ),
+    ]
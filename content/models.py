@@ -1,50 +1,88 @@
-from django.db import models
+import io
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, models, transaction
+from django.db.models import F
 from django.contrib import admin
 
 from django.core.files import storage
 
+from django.utils import timezone
 from django.utils.text import slugify
 
+from common.pagination import invalidate_counts_on
+from common.search_index import FullTextIndex
+from content.covers import (
+    evict_issue_covers,
+    evict_stale_issue_covers,
+    get_render_executor,
+    render_issue_covers,
+)
+from content.slate import RENDER_VERSION, slate_to_html
+from content.text import html_to_text, slate_to_text
+from content.xml_export import (
+    ARTICLE_XML_FIELDS,
+    iter_issue_archive,
+    write_article_xml,
+)
 from user.models import SluglineUser
 
-import io
-import fitz
-from PIL import Image
-
 
 ISSUE_UPLOAD_DIR = "issue_pdfs"
-SIZES = [1, 2]
 
 
 class OverwriteStorage(storage.FileSystemStorage):
-    """https://djangosnippets.org/snippets/976/"""
+    """https://djangosnippets.org/snippets/976/
+
+    The covers rendered beside each PDF are evicted when it is deleted, or overwritten with different content.
+    """
 
     def get_available_name(self, name, max_length=None):
-        self.delete(name)
+        # Only remove the PDF itself; whether its covers survive depends on what gets uploaded in its place
+        super().delete(name)
+        return name
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        evict_stale_issue_covers(self.path(name))
         return name
 
+    def delete(self, name):
+        super().delete(name)
+        evict_issue_covers(self.path(name))
+
 
 class IssueManager(models.Manager):
     def latest_issue(self):
         return self.all().first()
 
-
-def get_issue_cover_paths(issue_path, sizes=None):
-    """Given a path to an issue, returns the cover image paths. Returns RGB for full colour, and LA for grayscale.
-
-    LA stands for luminosity and alpha; we do not produce an alpha channel, however, and the LA distinction is
-    strictly historical.
-    """
-    if sizes is None:
-        sizes = SIZES
-    return [
-        path
-        for size in sizes
-        for path in (
-            issue_path + ".COVER-RGB-{}x.png".format(size),
-            issue_path + ".COVER-LA-{}x.png".format(size),
-        )
-    ]
+    def resolve(self, keys):
+        """Returns a dict mapping each (volume_num, issue_code) pair in keys to its issue, creating the issues that
+        don't exist yet. Takes at most three queries however many issues there are.
+        """
+        keys = set(keys)
+        if not keys:
+            return {}
+
+        def fetch():
+            issues = {}
+            for issue in self.filter(volume_num__in={volume for volume, _ in keys}):
+                key = (issue.volume_num, issue.issue_code)
+                if key in keys:
+                    issues[key] = issue
+            return issues
+
+        issues = fetch()
+        missing = keys - issues.keys()
+        if missing:
+            # Issues created concurrently are skipped, and fetched along with ours
+            self.bulk_create(
+                [Issue(volume_num=volume, issue_code=code) for volume, code in missing],
+                ignore_conflicts=True,
+            )
+            issues = fetch()
+        return issues
 
 
 class Issue(models.Model):
@@ -112,26 +150,197 @@ class Issue(models.Model):
     def __str__(self):
         return self.short_name()
 
+    @property
+    def cover_status(self):
+        """The status of the most recent cover render for this issue, or None if covers were never rendered."""
+        try:
+            return self.cover_render_job.status
+        except CoverRenderJob.DoesNotExist:
+            return None
+
     def save(self, *args, **kwargs):
+        # An uncommitted file is one that was just uploaded; only then do the covers need rendering
+        pdf_changed = bool(self.pdf) and not self.pdf._committed
         super().save(*args, **kwargs)
 
-        if self.pdf:
-            doc = fitz.Document(self.pdf.path)
-            cover = doc[0]
-            for size in SIZES:
-                cover_pix = cover.getPixmap(matrix=fitz.Matrix(size / 2, size / 2))
-                bytes_stream = io.BytesIO(
-                    cover_pix.getImageData(output="ppm")
-                )  # We use ppm for speed
-                cover_la_img = Image.open(bytes_stream).convert("L")
+        if pdf_changed:
+            CoverRenderJob.objects.enqueue(self)
 
-                path_rgb, path_la = get_issue_cover_paths(self.pdf.path, sizes=[size])
-                cover_pix.writePNG(path_rgb)
-                cover_la_img.save(path_la, "PNG")
+    def xml_archive(self, workers=None):
+        """Returns an iterator over the bytes of a zip archive of this issue's articles as InDesign XML, rendered
+        across workers processes (by default XML_EXPORT_PROCESSES). See content.xml_export.iter_issue_archive.
+        """
+        articles = (
+            Article.objects.filter(issue=self)
+            .order_by("pk")
+            .values(*ARTICLE_XML_FIELDS)
+            .iterator()
+        )
+        if workers is None:
+            workers = settings.XML_EXPORT_PROCESSES
+        return iter_issue_archive(articles, workers)
 
     class Meta:
         unique_together = ("volume_num", "issue_code")
         ordering = ["-volume_num", "-issue_code"]
+        indexes = [models.Index(fields=["publish_date"], name="issue_publish_date_idx")]
+
+
+class CoverRenderJobManager(models.Manager):
+    def enqueue(self, issue, schedule=True):
+        """Queues a cover render for the issue. An issue has at most one job, so enqueueing an issue that already has
+        a pending job is a no-op, and enqueueing one whose job is running will render it again once it finishes.
+
+        If schedule is False, the job is left for the render_covers worker regardless of COVER_RENDER_MODE.
+        """
+        job, _ = self.update_or_create(
+            issue=issue,
+            defaults={"status": CoverRenderJob.Status.PENDING, "error": ""},
+        )
+        if schedule:
+            if settings.COVER_RENDER_MODE == "sync":
+                job.run()
+            elif settings.COVER_RENDER_MODE == "thread":
+                # Wait for the commit so the worker thread can see the job
+                transaction.on_commit(
+                    lambda: get_render_executor().submit(_run_job_in_thread, job.pk)
+                )
+        return job
+
+    def next_pending(self):
+        return self.filter(status=CoverRenderJob.Status.PENDING).first()
+
+    def requeue_stale(self, older_than):
+        """Returns jobs that have been running for longer than older_than (a timedelta) to the queue. These are
+        left behind by workers that died mid-render.
+        """
+        return self.filter(
+            status=CoverRenderJob.Status.RUNNING,
+            date_modified__lt=timezone.now() - older_than,
+        ).update(status=CoverRenderJob.Status.PENDING, date_modified=timezone.now())
+
+
+class CoverRenderJob(models.Model):
+    """A queued render of an issue's cover images."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    objects = CoverRenderJobManager()
+
+    issue = models.OneToOneField(
+        Issue, on_delete=models.CASCADE, related_name="cover_render_job"
+    )
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cover render for {self.issue_id}: {self.status}"
+
+    def claim(self):
+        """Atomically marks this job as running. Returns False if it is not pending, e.g. if another worker has
+        already claimed it.
+        """
+        claimed = CoverRenderJob.objects.filter(
+            pk=self.pk, status=CoverRenderJob.Status.PENDING
+        ).update(
+            status=CoverRenderJob.Status.RUNNING,
+            attempts=F("attempts") + 1,
+            date_modified=timezone.now(),
+        )
+        return claimed == 1
+
+    def run(self, workers=None):
+        """Claims and renders this job, encoding covers across workers processes (see render_issue_covers). Returns
+        False if the job could not be claimed.
+        """
+        if not self.claim():
+            return False
+
+        status, error = CoverRenderJob.Status.DONE, ""
+        try:
+            issue = Issue.objects.get(pk=self.issue_id)
+            if issue.pdf:
+                render_issue_covers(issue.pdf.path, workers=workers)
+        except Exception as e:
+            status, error = CoverRenderJob.Status.FAILED, f"{type(e).__name__}: {e}"
+
+        # If the issue was saved again while we were rendering, the job is pending again and must stay that way
+        CoverRenderJob.objects.filter(
+            pk=self.pk, status=CoverRenderJob.Status.RUNNING
+        ).update(status=status, error=error, date_modified=timezone.now())
+        self.refresh_from_db()
+        return True
+
+
+def _run_job_in_thread(job_id):
+    try:
+        job = CoverRenderJob.objects.filter(pk=job_id).first()
+        if job is not None:
+            job.run()
+    finally:
+        # Worker threads get their own connection, which Django will not clean up for us
+        connection.close()
+
+
+ARTICLE_SEARCH_INDEX = FullTextIndex(
+    table="content_article",
+    columns=["title", "content_plain"],
+    fts_table="content_article_fts",
+)
+
+
+class ArticleQuerySet(models.QuerySet):
+    LISTING_FIELDS = (
+        "id",
+        "title",
+        "slug",
+        "sub_title",
+        "author",
+        "article_type",
+        "status",
+        "is_article_of_issue",
+        "is_promo",
+        "issue",
+        "issue__publish_date",
+        "user",
+        "date_created",
+        "date_modified",
+    )
+    """The columns that article listings need, along with the issue's publish date for Article.published."""
+
+    def for_listing(self):
+        """Loads only what article listings show, leaving out article bodies, in one query."""
+        return self.select_related("issue").only(*self.LISTING_FIELDS)
+
+    def with_content(self):
+        """Loads article bodies, which are deferred by default as only a few views need them."""
+        return self.defer(None).defer("content_plain")
+
+    def visible_to(self, user):
+        """Filters to the articles that user may read: every article if they are signed in, or else only
+        published ones.
+        """
+        if user.is_authenticated:
+            return self
+        return self.filter(issue__publish_date__isnull=False)
+
+
+class ArticleManager(models.Manager.from_queryset(ArticleQuerySet)):
+    # Bodies can be large, e.g. prettified WordPress HTML, and most queries don't need them
+    DEFERRED_FIELDS = ("content_raw", "content_plain")
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*self.DEFERRED_FIELDS)
 
 
 class Article(models.Model):
@@ -155,6 +364,8 @@ class Article(models.Model):
     author = models.CharField(max_length=255, blank=True)
 
     content_raw = models.TextField(default="", blank=True)
+    content_plain = models.TextField(default="", blank=True, editable=False)
+    """content_raw as plain text, which is what searches look through. Kept up to date by save()."""
 
     article_type = models.CharField(
         max_length=16, choices=Type.choices, default=Type.SLATE
@@ -174,6 +385,38 @@ class Article(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
+    wordpress_guid = models.CharField(
+        max_length=255, unique=True, null=True, blank=True, editable=False
+    )
+    """The GUID of the WordPress post this article was imported from, which keys it when syncing."""
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    """A hash of the WordPress post as it was imported, to tell whether it changed since."""
+
+    objects = ArticleManager()
+
+    class Meta:
+        # These back the sorts that article views allow
+        indexes = [
+            models.Index(
+                fields=["issue", "status", "date_modified"],
+                name="article_issue_status_idx",
+            ),
+            models.Index(fields=["issue", "title"], name="article_issue_title_idx"),
+            models.Index(
+                fields=["issue", "date_modified"], name="article_issue_modified_idx"
+            ),
+            models.Index(fields=["title"], name="article_title_idx"),
+            models.Index(fields=["date_created"], name="article_created_idx"),
+            models.Index(fields=["date_modified"], name="article_modified_idx"),
+            models.Index(fields=["user", "title"], name="article_user_title_idx"),
+            models.Index(
+                fields=["user", "date_created"], name="article_user_created_idx"
+            ),
+            models.Index(
+                fields=["user", "date_modified"], name="article_user_modified_idx"
+            ),
+        ]
+
     @property
     def published(self):
         return self.issue.published
@@ -182,23 +425,59 @@ class Article(models.Model):
         if self.article_type == Article.Type.WORDPRESS:
             return self.content_raw
         elif self.article_type == Article.Type.SLATE:
-            raise NotImplementedError(
-                "render_to_html not implemented for Slate articles"
-            )
+            return slate_to_html(self.content_raw)
+
+    @property
+    def html_version(self):
+        """Identifies this version of the article's rendered HTML; it changes whenever the article is saved."""
+        return "{}-{}-{}".format(
+            self.pk, int(self.date_modified.timestamp() * 1000000), RENDER_VERSION
+        )
+
+    def render_to_html_cached(self):
+        """Returns render_to_html() from the ARTICLE_HTML_CACHE cache if this version of the article has been rendered
+        before. The article's body is only loaded if it has to be rendered.
+        """
+        cache = caches[settings.ARTICLE_HTML_CACHE]
+        key = f"slugline:article-html:{self.html_version}"
+        html = cache.get(key)
+        if html is None:
+            html = self.render_to_html()
+            cache.set(key, html, settings.ARTICLE_HTML_CACHE_TIMEOUT)
+        return html
+
+    def render_to_text(self):
+        """Returns the text of this article, without markup."""
+        if self.article_type == Article.Type.WORDPRESS:
+            return html_to_text(self.content_raw)
+        elif self.article_type == Article.Type.SLATE:
+            return slate_to_text(self.content_raw)
 
     def render_to_xml(self):
         """Returns this article converted to InDesign-compatible XML
         for print export.
         """
-        raise NotImplementedError("render_to_xml not implemented")
+        out = io.StringIO()
+        write_article_xml(
+            {field: getattr(self, field) for field in ARTICLE_XML_FIELDS}, out
+        )
+        return out.getvalue()
 
     def __str__(self):
         return f"{self.title} by {self.author}"
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, update_fields=None, **kwargs):
         self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+        # If the body wasn't loaded it can't have changed, and it won't be saved
+        if "content_raw" not in self.get_deferred_fields():
+            self.content_plain = self.render_to_text()
+            if update_fields is not None and "content_raw" in update_fields:
+                update_fields = {*update_fields, "content_plain"}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
 
+invalidate_counts_on(Issue, Article)
 
 admin.site.register(Issue)
 admin.site.register(Article)
+admin.site.register(CoverRenderJob)
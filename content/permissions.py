@@ -8,4 +8,5 @@ class IsArticlePublished(SluglinePermission):
 
 class IsArticleOwner(SluglinePermission):
     def has_object_permission(self, request, view, article):
-        return article.user == request.user
+        # Compare ids, so that the article's user doesn't have to be loaded
+        return request.user.is_authenticated and article.user_id == request.user.pk
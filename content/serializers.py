@@ -1,9 +1,12 @@
 from rest_framework import serializers
 
+from common.serializers import TimedSerializerMixin
 from content.models import Article, Issue
 
 
-class IssueSerializer(serializers.ModelSerializer):
+class IssueSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    cover_status = serializers.CharField(read_only=True)
+
     class Meta:
         model = Issue
         fields = (
@@ -15,6 +18,7 @@ class IssueSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "colour",
+            "cover_status",
         )
         read_only_fields = ("publish_date", "pdf")
         # override the default unique_together message
@@ -27,7 +31,7 @@ class IssueSerializer(serializers.ModelSerializer):
         ]
 
 
-class ArticleSerializer(serializers.ModelSerializer):
+class ArticleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     title = serializers.CharField(required=False, default="")
     sub_title = serializers.CharField(required=False, default="", allow_blank=True)
     article_type = serializers.CharField(required=False, default=Article.Type.SLATE)
@@ -54,14 +58,14 @@ class ArticleSerializer(serializers.ModelSerializer):
         read_only_fields = ("slug", "is_article_of_issue", "is_promo", "user")
 
 
-class ArticleContentSerializer(serializers.ModelSerializer):
+class ArticleContentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Article
         fields = ("content_raw",)
 
 
-class ArticleHTMLSerializer(serializers.ModelSerializer):
-    html = serializers.CharField(source="render_to_html", read_only=True)
+class ArticleHTMLSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    html = serializers.CharField(source="render_to_html_cached", read_only=True)
 
     class Meta:
         model = Article
@@ -0,0 +1,154 @@
+import io
+import json
+from html import escape
+from urllib.parse import urlparse
+
+
+RENDER_VERSION = 1
+"""Bump this whenever rendering changes its output, so that cached HTML is re-rendered."""
+
+SAFE_URL_SCHEMES = {"", "http", "https", "mailto"}
+"""URL schemes that links and images may use; anything else, like javascript:, is dropped."""
+
+
+def safe_url(url):
+    if not isinstance(url, str):
+        return None
+    try:
+        scheme = urlparse(url.strip()).scheme.lower()
+    except ValueError:
+        return None
+    return url if scheme in SAFE_URL_SCHEMES else None
+
+
+def tag(name, void=False, **attrs):
+    """Returns an element renderer that wraps an element's children in an HTML tag. Each keyword argument maps an
+    attribute to a function taking the Slate node and returning the attribute's value, or None to leave it out.
+    Void tags, like img, have no children or closing tag.
+    """
+
+    def render(node):
+        parts = [name]
+        for attr, get in attrs.items():
+            value = get(node)
+            if value is not None:
+                parts.append('{}="{}"'.format(attr.rstrip("_"), escape(str(value))))
+        return "<{}>".format(" ".join(parts)), "" if void else f"</{name}>"
+
+    render.void = void
+    return render
+
+
+ELEMENTS = {
+    "paragraph": tag("p"),
+    "heading-one": tag("h1"),
+    "heading-two": tag("h2"),
+    "heading-three": tag("h3"),
+    "heading-four": tag("h4"),
+    "heading-five": tag("h5"),
+    "heading-six": tag("h6"),
+    "block-quote": tag("blockquote"),
+    "bulleted-list": tag("ul"),
+    "numbered-list": tag("ol"),
+    "list-item": tag("li"),
+    "code-block": tag("pre"),
+    "link": tag("a", href=lambda node: safe_url(node.get("url"))),
+    "image": tag(
+        "img",
+        void=True,
+        src=lambda node: safe_url(node.get("url")),
+        alt=lambda node: node.get("alt"),
+    ),
+    "line-break": tag("br", void=True),
+}
+"""
+Renderers for each type of element, keyed by the element's `type`. A renderer takes the element's node and returns
+the HTML to write before and after its children. Elements of unknown types are rendered as just their children.
+"""
+
+MARKS = {
+    "bold": "strong",
+    "italic": "em",
+    "underline": "u",
+    "strikethrough": "s",
+    "code": "code",
+    "superscript": "sup",
+    "subscript": "sub",
+}
+"""Tags for each mark a text leaf can have, outermost first."""
+
+
+class SlateRenderer:
+    """
+    Renders Slate documents as HTML. The document tree is walked with an explicit stack rather than recursion, so
+    nesting depth is only limited by memory, and HTML is written straight to an output stream instead of being built
+    up from strings.
+
+    The elements and marks it knows can be extended by passing registries like ELEMENTS and MARKS.
+    """
+
+    def __init__(self, elements=None, marks=None):
+        self.elements = ELEMENTS if elements is None else elements
+        self.marks = list((MARKS if marks is None else marks).items())
+
+    def render(self, content):
+        """Returns the HTML for a serialized Slate document. Content that isn't valid JSON is rendered as a
+        paragraph of plain text.
+        """
+        out = io.StringIO()
+        self.render_to(content, out)
+        return out.getvalue()
+
+    def render_to(self, content, out):
+        """Writes the HTML for a serialized Slate document to out, which only needs a write method."""
+        try:
+            nodes = json.loads(content)
+        except ValueError:
+            if content:
+                out.write("<p>{}</p>".format(escape(content, quote=False)))
+            return
+        self.render_nodes_to(nodes, out)
+
+    def render_nodes_to(self, nodes, out):
+        """Writes the HTML for already parsed Slate nodes to out."""
+        write = out.write
+        # The stack holds nodes still to render, and 1-tuples of the HTML closing elements whose children are being
+        # rendered, which can't be mistaken for nodes
+        stack = [nodes]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                write(node[0])
+            elif isinstance(node, str):
+                write(escape(node, quote=False))
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
+            elif isinstance(node, dict):
+                if isinstance(node.get("text"), str):
+                    self.write_text(node, write)
+                    continue
+                render = self.elements.get(node.get("type"))
+                if render is None:
+                    stack.append(node.get("children", []))
+                    continue
+                opening, closing = render(node)
+                write(opening)
+                if not getattr(render, "void", False):
+                    stack.append((closing,))
+                    stack.append(node.get("children", []))
+
+    def write_text(self, leaf, write):
+        marks = [tag for mark, tag in self.marks if leaf.get(mark)]
+        for mark in marks:
+            write(f"<{mark}>")
+        write(escape(leaf["text"], quote=False))
+        for mark in reversed(marks):
+            write(f"</{mark}>")
+
+
+_default_renderer = SlateRenderer()
+
+
+def slate_to_html(content):
+    """Returns the HTML for a serialized Slate document, using the default element and mark registries."""
+    return _default_renderer.render(content)
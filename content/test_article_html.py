@@ -0,0 +1,60 @@
+from django.core.cache import cache
+
+from content.models import Article
+from content.tests import ContentTestCase
+
+
+class ArticleHTMLTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        cache.clear()
+        self.article = Article.objects.create(
+            title="Goose",
+            content_raw="<p>Honk</p>",
+            article_type=Article.Type.WORDPRESS,
+            issue=self.published_issue,
+        )
+        self.url = f"/api/article_html/{self.article.id}/"
+
+    def test_serves_html(self):
+        response = self.c.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"html": "<p>Honk</p>"})
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+
+    def test_cached_html_does_not_load_body(self):
+        with self.assertNumQueries(2):
+            self.c.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.c.get(self.url)
+        self.assertEqual(response.data, {"html": "<p>Honk</p>"})
+
+    def test_save_invalidates(self):
+        etag = self.c.get(self.url)["ETag"]
+        self.article.content_raw = "<p>Hiss</p>"
+        self.article.save()
+        response = self.c.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"html": "<p>Hiss</p>"})
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_not_modified(self):
+        first = self.c.get(self.url)
+
+        response = self.c.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        response = self.c.get(self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unpublished_articles_need_authentication(self):
+        self.article.issue = self.unpublished_issue
+        self.article.save()
+
+        self.assertEqual(self.c.get(self.url).status_code, 403)
+        self.c.force_authenticate(self.contrib)
+        response = self.c.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("private", response["Cache-Control"])
@@ -0,0 +1,96 @@
+from django.test import override_settings
+
+from content.models import Article, ARTICLE_SEARCH_INDEX
+from content.tests import ContentTestCase
+
+
+class ArticleSearchTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.goose = Article.objects.create(
+            title="Goose Sightings",
+            content_raw="A goose was seen near the MC building.",
+            issue=self.published_issue,
+            status=Article.Status.OKAYED,
+        )
+        self.geese = Article.objects.create(
+            title="On Geese",
+            content_raw="Geese are loud. The goose is louder than most geese.",
+            issue=self.published_issue,
+        )
+        self.c.force_authenticate(self.editor)
+
+    def search(self, query, url="/api/articles/"):
+        response = self.c.get(url, {"search": query})
+        self.assertEqual(response.status_code, 200)
+        return [article["id"] for article in response.data["results"]]
+
+    def test_uses_full_text_index(self):
+        self.assertEqual(ARTICLE_SEARCH_INDEX.backend(), "sqlite")
+
+    def test_finds_terms(self):
+        self.assertCountEqual(self.search("goose"), [self.goose.id, self.geese.id])
+        self.assertEqual(self.search("loud"), [self.geese.id])
+
+    def test_ranks_results(self):
+        self.assertEqual(self.search("geese")[0], self.geese.id)
+        self.assertEqual(self.search("sightings goose")[0], self.goose.id)
+
+    def test_tracks_updates_and_deletes(self):
+        self.geese.content_raw = "Nothing to see here."
+        self.geese.title = "Nothing"
+        self.geese.save()
+        self.assertEqual(self.search("geese"), [])
+
+        self.goose.delete()
+        self.assertEqual(self.search("goose"), [])
+
+    def test_tracks_bulk_creates(self):
+        Article.objects.bulk_create(
+            [
+                Article(
+                    title="Swans", content_raw="Swan song", issue=self.published_issue
+                )
+            ]
+        )
+        self.assertEqual(len(self.search("swan")), 1)
+
+    def test_filters_still_apply(self):
+        self.assertIn(self.goose.id, self.search("is:okayed"))
+
+    def test_input_is_not_fts_syntax(self):
+        self.assertEqual(self.search("NEAR(goose* AND"), [])
+
+    def test_issue_articles(self):
+        self.assertEqual(
+            self.search("loud", url=f"/api/issues/{self.published_issue.id}/articles/"),
+            [self.geese.id],
+        )
+
+    @override_settings(SEARCH_INDEX_BACKEND="none")
+    def test_without_index(self):
+        self.assertEqual(self.search("loud"), [self.geese.id])
+
+
+class ArticlePlainTextTestCase(ContentTestCase):
+    def test_wordpress_markup_is_not_searched(self):
+        article = Article.objects.create(
+            title="Markup",
+            article_type=Article.Type.WORDPRESS,
+            content_raw='<p class="strong">Some <em>emphasised</em>&amp;text</p>',
+            issue=self.published_issue,
+        )
+        self.assertEqual(article.content_plain, "Some emphasised &text")
+
+        self.c.force_authenticate(self.editor)
+        response = self.c.get("/api/articles/", {"search": "strong"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_slate_text(self):
+        article = Article.objects.create(
+            title="Slate",
+            content_raw='[{"type": "paragraph", "children": [{"text": "Hello "}, {"text": "world", "bold": true}]},'
+            '{"type": "paragraph", "children": [{"text": "again"}]}]',
+            issue=self.published_issue,
+        )
+        self.assertEqual(article.content_plain, "Hello world again")
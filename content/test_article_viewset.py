@@ -1,3 +1,6 @@
+from django.contrib.auth.models import AnonymousUser
+
+from content.models import Article
 from content.tests import ContentTestCase
 
 
@@ -76,3 +79,64 @@ class ArticleTestCase(ContentTestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["title"], self.published_article.title)
+
+    def test_visible_to(self):
+        self.assertCountEqual(
+            Article.objects.visible_to(AnonymousUser()), [self.published_article]
+        )
+        self.assertCountEqual(
+            Article.objects.visible_to(self.contrib),
+            [self.published_article, self.unpublished_article],
+        )
+
+    def test_unauthed_does_not_own_unowned_articles(self):
+        self.c.force_authenticate(None)
+        response = self.c.patch(
+            f"/api/articles/{self.published_article.id}/", {"title": "New Title"}
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+
+class ArticleContentDeferralTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.published_article.content_raw = "A goose appears"
+        self.published_article.save()
+
+    def test_bodies_are_deferred(self):
+        article = Article.objects.get(pk=self.published_article.pk)
+
+        self.assertEqual(
+            article.get_deferred_fields(), {"content_raw", "content_plain"}
+        )
+        article = Article.objects.with_content().get(pk=article.pk)
+        self.assertEqual(article.get_deferred_fields(), {"content_plain"})
+
+    def test_metadata_save_does_not_load_body(self):
+        article = Article.objects.get(pk=self.published_article.pk)
+        article.title = "New Title"
+        with self.assertNumQueries(1):
+            article.save()
+
+        article = Article.objects.with_content().get(pk=article.pk)
+        self.assertEqual(article.content_raw, "A goose appears")
+        self.assertEqual(
+            Article.objects.values_list("content_plain", flat=True).get(pk=article.pk),
+            "A goose appears",
+        )
+
+    def test_content_endpoint_updates_plain_text(self):
+        self.c.force_authenticate(self.editor)
+        response = self.c.patch(
+            f"/api/article_content/{self.published_article.pk}/",
+            {"content_raw": "A swan appears"},
+        )
+
+        self.assertEqual(response.data["content_raw"], "A swan appears")
+        self.assertEqual(
+            Article.objects.values_list("content_plain", flat=True).get(
+                pk=self.published_article.pk
+            ),
+            "A swan appears",
+        )
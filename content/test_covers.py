@@ -0,0 +1,242 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import fitz
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+
+from common.benchmarks import benchmark
+from content.covers import (
+    SIZES,
+    evict_issue_covers,
+    get_issue_cover_paths,
+    render_issue_covers,
+)
+from content.models import CoverRenderJob
+from content.tests import ContentTestCase
+
+
+def make_pdf(pages=1, text="mathNEWS"):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.newPage()
+        page.insertText((72, 72), f"{text} page {i}", fontsize=24)
+        page.drawRect(fitz.Rect(72, 144, 540, 720), color=(0, 0, 0), fill=(1, 0, 0))
+    return doc.write()
+
+
+class CoverTestCase(ContentTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            COVER_RENDER_MODE="worker",
+            COVER_FORMATS=["webp"],
+        )
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload_pdf(self, issue, content=None):
+        issue.pdf = SimpleUploadedFile(
+            "v666i1.pdf", content or make_pdf(), content_type="application/pdf"
+        )
+        issue.save()
+
+
+class CoverRenderQueueTestCase(CoverTestCase):
+    def test_upload_queues_render(self):
+        self.upload_pdf(self.unpublished_issue)
+
+        self.assertEqual(self.unpublished_issue.cover_status, "pending")
+        for path in get_issue_cover_paths(self.unpublished_issue.pdf.path):
+            self.assertFalse(os.path.exists(path))
+
+    def test_job_renders_covers(self):
+        self.upload_pdf(self.unpublished_issue)
+        job = CoverRenderJob.objects.get(issue=self.unpublished_issue)
+
+        self.assertTrue(job.run())
+        self.assertEqual(job.status, CoverRenderJob.Status.DONE)
+        for path in get_issue_cover_paths(self.unpublished_issue.pdf.path):
+            self.assertTrue(os.path.exists(path))
+
+    def test_claimed_job_is_not_run_twice(self):
+        self.upload_pdf(self.unpublished_issue)
+        job = CoverRenderJob.objects.get(issue=self.unpublished_issue)
+
+        self.assertTrue(job.claim())
+        self.assertFalse(job.run())
+
+    def test_metadata_save_does_not_queue_render(self):
+        self.upload_pdf(self.unpublished_issue)
+        CoverRenderJob.objects.get(issue=self.unpublished_issue).run()
+
+        self.unpublished_issue.title = "New Title"
+        self.unpublished_issue.save()
+
+        self.unpublished_issue.refresh_from_db()
+        self.assertEqual(self.unpublished_issue.cover_status, "done")
+
+    def test_bad_pdf_fails_job(self):
+        self.upload_pdf(self.unpublished_issue, content=b"not a pdf")
+        job = CoverRenderJob.objects.get(issue=self.unpublished_issue)
+        job.run()
+
+        self.assertEqual(job.status, CoverRenderJob.Status.FAILED)
+        self.assertNotEqual(job.error, "")
+
+    def test_worker_drains_queue(self):
+        self.upload_pdf(self.unpublished_issue)
+        call_command("render_covers", once=True, stdout=open(os.devnull, "w"))
+
+        self.assertEqual(
+            CoverRenderJob.objects.get(issue=self.unpublished_issue).status,
+            CoverRenderJob.Status.DONE,
+        )
+
+    def test_api_exposes_status(self):
+        self.upload_pdf(self.unpublished_issue)
+        self.c.force_authenticate(self.editor)
+        response = self.c.get(f"/api/issues/{self.unpublished_issue.id}/")
+
+        self.assertEqual(response.data["cover_status"], "pending")
+
+
+class CoverCacheTestCase(CoverTestCase):
+    def render(self):
+        CoverRenderJob.objects.get(issue=self.unpublished_issue).run()
+
+    def test_identical_upload_is_not_rerendered(self):
+        pdf = make_pdf()
+        self.upload_pdf(self.unpublished_issue, content=pdf)
+        self.render()
+
+        self.upload_pdf(self.unpublished_issue, content=pdf)
+        with mock.patch("content.covers.fitz.Document") as document:
+            self.render()
+            document.assert_not_called()
+        for path in get_issue_cover_paths(self.unpublished_issue.pdf.path):
+            self.assertTrue(os.path.exists(path))
+
+    def test_missing_cover_is_rerendered(self):
+        self.upload_pdf(self.unpublished_issue)
+        self.render()
+        path = get_issue_cover_paths(self.unpublished_issue.pdf.path)[0]
+        os.remove(path)
+
+        self.assertEqual(render_issue_covers(self.unpublished_issue.pdf.path), [path])
+        self.assertTrue(os.path.exists(path))
+
+    def test_replaced_pdf_evicts_covers(self):
+        self.upload_pdf(self.unpublished_issue, content=make_pdf(text="old"))
+        self.render()
+
+        self.upload_pdf(self.unpublished_issue, content=make_pdf(text="new"))
+        for path in get_issue_cover_paths(self.unpublished_issue.pdf.path):
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.unpublished_issue.cover_status, "pending")
+
+    def test_deleted_pdf_evicts_covers(self):
+        self.upload_pdf(self.unpublished_issue)
+        self.render()
+        pdf_path = self.unpublished_issue.pdf.path
+
+        self.unpublished_issue.pdf.delete()
+        self.assertEqual(os.listdir(os.path.dirname(pdf_path)), [])
+
+
+class CoverPipelineTestCase(CoverTestCase):
+    def test_sizes_are_derived_from_largest(self):
+        self.upload_pdf(self.unpublished_issue)
+        render_issue_covers(self.unpublished_issue.pdf.path)
+
+        paths = get_issue_cover_paths(self.unpublished_issue.pdf.path)
+        with Image.open(paths[0]) as small, Image.open(paths[-2]) as large:
+            self.assertEqual(small.mode, "RGB")
+            self.assertAlmostEqual(
+                small.width * max(SIZES) / min(SIZES), large.width, delta=1
+            )
+        with Image.open(paths[1]) as grayscale:
+            self.assertEqual(grayscale.mode, "L")
+
+    def test_benchmark_cover_generation(self):
+        """Renders the covers of a synthetic 40 page issue from scratch. Fails if this gets egregiously slow."""
+        self.upload_pdf(self.unpublished_issue, content=make_pdf(pages=40))
+        pdf_path = self.unpublished_issue.pdf.path
+
+        def render():
+            evict_issue_covers(pdf_path)
+            render_issue_covers(pdf_path)
+
+        self.assertLess(benchmark("cover generation (40 pages)", render), 5)
+
+
+class CoverEndpointTestCase(CoverTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.upload_pdf(self.published_issue)
+        render_issue_covers(self.published_issue.pdf.path)
+        self.url = f"/api/published_issues/{self.published_issue.id}/cover/"
+
+    def test_serves_webp_when_accepted(self):
+        response = self.c.get(self.url, HTTP_ACCEPT="image/webp,image/*;q=0.8")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("Accept", response["Vary"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_falls_back_to_png(self):
+        response = self.c.get(self.url, HTTP_ACCEPT="image/png")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+
+    def test_not_modified(self):
+        etag = self.c.get(self.url, HTTP_ACCEPT="image/webp")["ETag"]
+        response = self.c.get(
+            self.url, HTTP_ACCEPT="image/webp", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_replaced_pdf_changes_etag(self):
+        etag = self.c.get(self.url, HTTP_ACCEPT="image/webp")["ETag"]
+        self.upload_pdf(self.published_issue, make_pdf(text="Replaced"))
+        render_issue_covers(self.published_issue.pdf.path)
+        response = self.c.get(
+            self.url, HTTP_ACCEPT="image/webp", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_selects_variant(self):
+        response = self.c.get(
+            self.url, {"size": 2, "colour": "la"}, HTTP_ACCEPT="image/png"
+        )
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as cover:
+            self.assertEqual(cover.mode, "L")
+
+    def test_invalid_variant(self):
+        response = self.c.get(self.url, {"size": 3}, HTTP_ACCEPT="image/png")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unrendered_cover(self):
+        response = self.c.get(
+            f"/api/published_issues/{self.published_issue.id}/cover/",
+            {"colour": "RGB"},
+            HTTP_ACCEPT="application/pdf",
+        )
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from common.pagination import SluglinePagination
+from common.testing import QueryBudgetMixin
+from content.models import ARTICLE_SEARCH_INDEX, Article, Issue
+from content.tests import ContentTestCase
+
+
+class ContentQueryBudgetTestCase(QueryBudgetMixin, ContentTestCase):
+    """Pins how many queries each content route may run, and checks that listing more rows doesn't take more."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.added = 0
+        self.add_rows()
+
+    def add_rows(self):
+        for _ in range(10):
+            self.added += 1
+            Issue.objects.create(volume_num=700, issue_code=str(self.added))
+        Article.objects.bulk_create(
+            Article(title=f"Article {i}", issue=self.published_issue, user=self.contrib)
+            for i in range(20)
+        )
+
+    def assertBudget(self, url, budget, user=None, status_code=200):
+        self.c.force_authenticate(user)
+
+        def get():
+            # Counts are cached between requests, which would hide their queries
+            cache.clear()
+            with self.assertMaxQueries(budget):
+                response = self.c.get(url)
+            self.assertEqual(response.status_code, status_code)
+
+        self.assertQueriesDoNotScale(get, self.add_rows)
+
+    def test_issues(self):
+        issue = self.published_issue.id
+        self.assertBudget("/api/issues/", 2, self.editor)
+        self.assertBudget(f"/api/issues/{issue}/", 1, self.editor)
+        self.assertBudget("/api/issues/latest/", 2, self.editor)
+        self.assertBudget(f"/api/issues/{issue}/articles/", 3, self.editor)
+        self.assertBudget(f"/api/issues/{issue}/articles/", 3)
+        self.assertBudget(f"/api/issues/{issue}/cover/", 1, self.editor, 404)
+
+    def test_published_issues(self):
+        issue = self.published_issue.id
+        self.assertBudget("/api/published_issues/", 2)
+        self.assertBudget(f"/api/published_issues/{issue}/", 1)
+        self.assertBudget("/api/published_issues/latest/", 1)
+        self.assertBudget(f"/api/published_issues/{issue}/cover/", 1, None, 404)
+
+    def test_articles(self):
+        article = self.published_article.id
+        self.assertBudget("/api/articles/", 2, self.editor)
+        self.assertBudget("/api/articles/", 2, self.contrib)
+        self.assertBudget(f"/api/articles/{article}/", 1, self.contrib)
+        self.assertBudget(f"/api/articles/{article}/", 1)
+
+    def test_user_articles(self):
+        self.assertBudget("/api/user_articles/", 2, self.contrib)
+
+    def test_article_content(self):
+        article = self.published_article.id
+        self.assertBudget(f"/api/article_content/{article}/", 1)
+
+        # The article, then its body, as the cache is cleared before each request
+        self.assertBudget(f"/api/article_html/{article}/", 2)
+
+    def test_listings_do_not_load_bodies(self):
+        Article.objects.bulk_create(
+            Article(
+                title=f"Long {i}", content_raw="x" * 1000, issue=self.published_issue
+            )
+            for i in range(100)
+        )
+        self.c.force_authenticate(self.editor)
+        # Whether the index exists is looked up once, which isn't part of any listing
+        ARTICLE_SEARCH_INDEX.backend()
+        for url in (
+            "/api/articles/",
+            f"/api/issues/{self.published_issue.id}/articles/",
+            "/api/articles/?search=long",
+        ):
+            cache.clear()
+            with mock.patch.object(SluglinePagination, "page_size", 100):
+                with self.assertMaxQueries(2 if "issues" not in url else 3) as queries:
+                    response = self.c.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data["results"]), 100)
+            for query in queries:
+                self.assertNotIn("content_raw", query["sql"])
+
+    def test_article_writes(self):
+        self.c.force_authenticate(self.contrib)
+        with self.assertMaxQueries(6):
+            response = self.c.post("/api/articles/", {"title": "New"})
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertMaxQueries(5):
+            response = self.c.patch(
+                f"/api/articles/{response.data['id']}/", {"title": "Newer"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_issue_writes(self):
+        self.c.force_authenticate(self.editor)
+        with self.assertMaxQueries(3):
+            response = self.c.post(
+                "/api/issues/", {"volume_num": 800, "issue_code": "1"}
+            )
+        self.assertEqual(response.status_code, 201)
+
+        issue = response.data["id"]
+        with self.assertMaxQueries(3):
+            response = self.c.patch(f"/api/issues/{issue}/", {"title": "Goose"})
+        self.assertEqual(response.status_code, 200)
+        with self.assertMaxQueries(4):
+            response = self.c.delete(f"/api/issues/{issue}/")
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(XML_EXPORT_PROCESSES=1)
+    def test_export(self):
+        # The issue, then its articles, however many there are
+        self.c.force_authenticate(self.copyeditor)
+
+        def export():
+            with self.assertMaxQueries(2):
+                response = self.c.get(f"/api/issues/{self.published_issue.id}/export/")
+                b"".join(response.streaming_content)
+            self.assertEqual(response.status_code, 200)
+
+        self.assertQueriesDoNotScale(export, self.add_rows)
@@ -0,0 +1,163 @@
+import io
+import json
+import random
+
+from django.test import TestCase
+
+from common.benchmarks import benchmark
+from content.models import Article
+from content.slate import ELEMENTS, SlateRenderer, slate_to_html, tag
+from content.tests import ContentTestCase
+
+
+def paragraph(*children):
+    return {"type": "paragraph", "children": list(children)}
+
+
+def make_document(nodes, seed=0):
+    """Returns a synthetic document of about the given number of nodes, with lists, links and marked text."""
+    rand = random.Random(seed)
+    document = []
+    count = 0
+    while count < nodes:
+        leaves = [
+            {"text": f"word {i} & more", "bold": rand.random() < 0.3}
+            for i in range(rand.randint(1, 8))
+        ]
+        if rand.random() < 0.2:
+            leaves.append(
+                {
+                    "type": "link",
+                    "url": "https://mathnews.uwaterloo.ca",
+                    "children": [{"text": "link"}],
+                }
+            )
+        block = paragraph(*leaves)
+        if rand.random() < 0.2:
+            block = {
+                "type": "bulleted-list",
+                "children": [{"type": "list-item", "children": [block]}],
+            }
+        document.append(block)
+        count += len(leaves) + 3
+    return document
+
+
+class SlateRendererTestCase(TestCase):
+    def render(self, nodes):
+        return slate_to_html(json.dumps(nodes))
+
+    def test_elements(self):
+        self.assertEqual(
+            self.render(
+                [
+                    {"type": "heading-one", "children": [{"text": "Title"}]},
+                    paragraph(
+                        {"text": "Hello "},
+                        {"type": "link", "url": "/x", "children": [{"text": "world"}]},
+                    ),
+                    {
+                        "type": "image",
+                        "url": "https://example.com/a.png",
+                        "alt": "A",
+                        "children": [{"text": ""}],
+                    },
+                ]
+            ),
+            '<h1>Title</h1><p>Hello <a href="/x">world</a></p><img src="https://example.com/a.png" alt="A">',
+        )
+
+    def test_marks(self):
+        self.assertEqual(
+            self.render(
+                [paragraph({"text": "x", "italic": True, "bold": True}, {"text": "y"})]
+            ),
+            "<p><strong><em>x</em></strong>y</p>",
+        )
+
+    def test_escapes(self):
+        self.assertEqual(
+            self.render(
+                [
+                    paragraph({"text": "<script>&"}),
+                    {
+                        "type": "link",
+                        "url": 'javascript:alert("x")',
+                        "children": [{"text": "a"}],
+                    },
+                    {"type": "link", "url": '/"><script>', "children": [{"text": "b"}]},
+                ]
+            ),
+            '<p>&lt;script&gt;&amp;</p><a>a</a><a href="/&quot;&gt;&lt;script&gt;">b</a>',
+        )
+
+    def test_unknown_elements_render_children(self):
+        self.assertEqual(
+            self.render([{"type": "mystery", "children": [{"text": "x"}]}]), "x"
+        )
+
+    def test_plain_text(self):
+        self.assertEqual(slate_to_html("not <json>"), "<p>not &lt;json&gt;</p>")
+        self.assertEqual(slate_to_html(""), "")
+
+    def test_deep_nesting(self):
+        node = {"text": "deep"}
+        for _ in range(100000):
+            node = {"type": "block-quote", "children": [node]}
+        # json.dumps itself recurses, so skip serializing the document
+        out = io.StringIO()
+        SlateRenderer().render_nodes_to([node], out)
+        self.assertEqual(
+            out.getvalue(),
+            "<blockquote>" * 100000 + "deep" + "</blockquote>" * 100000,
+        )
+
+    def test_custom_registry(self):
+        renderer = SlateRenderer(
+            elements={
+                **ELEMENTS,
+                "callout": tag("aside", class_=lambda node: node.get("kind")),
+            },
+            marks={"highlight": "mark"},
+        )
+        self.assertEqual(
+            renderer.render(
+                json.dumps(
+                    [
+                        {
+                            "type": "callout",
+                            "kind": "note",
+                            "children": [
+                                {"text": "x", "highlight": True, "bold": True}
+                            ],
+                        }
+                    ]
+                )
+            ),
+            '<aside class="note"><mark>x</mark></aside>',
+        )
+
+    def test_large_document(self):
+        document = make_document(50000)
+        html = self.render(document)
+
+        self.assertEqual(html.count("<p>"), len(document))
+        self.assertEqual(html.count("</p>"), len(document))
+        self.assertEqual(html.count("<strong>"), html.count("</strong>"))
+
+    def test_benchmark_render(self):
+        """Renders a synthetic 10k node article. Fails if this gets egregiously slow."""
+        content = json.dumps(make_document(10000))
+        self.assertLess(
+            benchmark("slate render (10k nodes)", lambda: slate_to_html(content)), 0.25
+        )
+
+
+class SlateArticleTestCase(ContentTestCase):
+    def test_render_to_html(self):
+        self.published_article.content_raw = json.dumps([paragraph({"text": "Honk"})])
+        self.published_article.save()
+
+        response = self.c.get(f"/api/article_html/{self.published_article.id}/")
+        self.assertEqual(response.data, {"html": "<p>Honk</p>"})
+        self.assertEqual(self.published_article.article_type, Article.Type.SLATE)
@@ -0,0 +1,373 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+from xml.sax.saxutils import escape
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from common.benchmarks import benchmark
+from common.parallel import imap_bounded
+from content.management.commands.wordpress import (
+    batched,
+    checkpoint_key,
+    iter_items,
+    normalize_post,
+    read_post,
+    scan_issues,
+)
+from content.models import ARTICLE_SEARCH_INDEX, Article, Issue
+from user.models import SluglineUser
+
+
+def make_item(i, issue="v150i1", content=None):
+    if content is None:
+        content = f"First paragraph {i}&nbsp;here\n\nSecond <b>bold</b> one\n\n<em>Author {i}</em>"
+    return f"""
+    <item>
+        <title>Post {i}</title>
+        <guid isPermaLink="false">https://mathnews.uwaterloo.ca/?p={i}</guid>
+        <category domain="category"><![CDATA[News]]></category>
+        <category domain="post_tag"><![CDATA[{issue}]]></category>
+        <content:encoded>{escape(content)}</content:encoded>
+    </item>"""
+
+
+def write_dump(path, items):
+    with open(path, "w") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+            "<channel><title>mathNEWS</title>"
+        )
+        for item in items:
+            f.write(item)
+        f.write("</channel></rss>")
+
+
+class WordpressDumpTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.dump = os.path.join(directory, "dump.xml")
+
+    def test_iter_items_clears_items(self):
+        write_dump(self.dump, (make_item(i) for i in range(5)))
+        titles = []
+        seen = []
+        for item in iter_items(self.dump):
+            titles.append(item.findtext("title"))
+            seen.append(item)
+        self.assertEqual(titles, [f"Post {i}" for i in range(5)])
+        self.assertTrue(all(len(item) == 0 for item in seen))
+
+    def test_read_post(self):
+        write_dump(self.dump, [make_item(0), make_item(1, issue="goose")])
+        posts = [read_post(item) for item in iter_items(self.dump)]
+        self.assertEqual(len(posts[0].pop("hash")), 64)
+        self.assertEqual(
+            posts[0],
+            {
+                "guid": "https://mathnews.uwaterloo.ca/?p=0",
+                "title": "Post 0",
+                "content": "First paragraph 0&nbsp;here\n\nSecond <b>bold</b> one\n\n<em>Author 0</em>",
+                "volume_num": 150,
+                "issue_code": "1",
+            },
+        )
+        self.assertIsNone(posts[1])
+
+    def test_scan_issues(self):
+        write_dump(
+            self.dump,
+            [
+                make_item(0),
+                make_item(1, issue="v150i2"),
+                make_item(2),
+                make_item(3, "x"),
+            ],
+        )
+        self.assertEqual(scan_issues(self.dump), {(150, "1"), (150, "2")})
+
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+
+class IssueResolveTestCase(TestCase):
+    def test_resolve(self):
+        existing = Issue.objects.create(volume_num=150, issue_code="1")
+        Issue.objects.create(volume_num=150, issue_code="3")
+
+        with self.assertNumQueries(3):
+            issues = Issue.objects.resolve([(150, "1"), (150, "2"), (151, "1")])
+        self.assertEqual(set(issues), {(150, "1"), (150, "2"), (151, "1")})
+        self.assertEqual(issues[150, "1"], existing)
+        self.assertEqual(issues[151, "1"].short_name(), "v151i1")
+        self.assertEqual(Issue.objects.count(), 4)
+
+    def test_resolve_existing(self):
+        Issue.objects.create(volume_num=150, issue_code="1")
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Issue.objects.resolve([(150, "1")])), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(Issue.objects.resolve([]), {})
+
+
+class WordpressImportTestCase(TransactionTestCase):
+    def setUp(self):
+        SluglineUser.objects.create(username="admin", is_superuser=True)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.dump = os.path.join(directory, "dump.xml")
+
+    def run_import(self, *args, **options):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch("builtins.input", return_value=""):
+            call_command(
+                "wordpress", self.dump, *args, stdout=stdout, stderr=stderr, **options
+            )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import(self):
+        write_dump(
+            self.dump,
+            [make_item(0), make_item(1, issue="v150i2"), make_item(2, issue="none")],
+        )
+        stdout, _ = self.run_import()
+
+        articles = Article.objects.with_content().order_by("title")
+        self.assertEqual([article.title for article in articles], ["Post 0", "Post 1"])
+        article = articles[0]
+        self.assertEqual(article.article_type, Article.Type.WORDPRESS)
+        self.assertEqual(article.author, "Author 0")
+        self.assertEqual(article.issue.short_name(), "v150i1")
+        self.assertEqual(
+            article.content_plain, "First paragraph 0 here Second bold one"
+        )
+        self.assertEqual(Issue.objects.count(), 2)
+        self.assertIn(
+            "Imported 2 articles (2 new, 0 changed), 0 unchanged, skipped 1 items",
+            stdout,
+        )
+
+    def test_import_in_batches(self):
+        write_dump(self.dump, (make_item(i) for i in range(25)))
+        stdout, _ = self.run_import(batch_size=10)
+
+        self.assertEqual(Article.objects.count(), 25)
+        self.assertIn("Imported 10 articles", stdout)
+        self.assertIn("Imported 20 articles", stdout)
+
+    def test_bad_item_is_skipped(self):
+        write_dump(self.dump, [make_item(0), make_item(1, content=""), make_item(2)])
+        _, stderr = self.run_import()
+
+        self.assertEqual(Article.objects.count(), 2)
+        self.assertIn("Skipping item 'Post 1'", stderr)
+
+    def test_written_batches_survive_a_failure(self):
+        write_dump(self.dump, (make_item(i) for i in range(25)))
+        bulk_create = Article.objects.bulk_create
+        calls = []
+
+        def fail_third_batch(batch, *args, **kwargs):
+            calls.append(batch)
+            if len(calls) == 3:
+                raise RuntimeError("database went away")
+            return bulk_create(batch, *args, **kwargs)
+
+        with mock.patch.object(Article.objects, "bulk_create", fail_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(batch_size=10)
+        self.assertEqual(Article.objects.count(), 20)
+
+    def test_issues_are_looked_up_once(self):
+        write_dump(
+            self.dump, (make_item(i, issue=f"v{100 + i % 20}i1") for i in range(100))
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import(batch_size=10)
+
+        issue_queries = [
+            query for query in queries if '"content_issue"' in query["sql"]
+        ]
+        # Fetching the existing issues, creating the rest, and fetching them again
+        self.assertEqual(len(issue_queries), 3)
+        self.assertEqual(Issue.objects.count(), 20)
+        self.assertEqual(Article.objects.count(), 100)
+
+    def test_import_across_workers(self):
+        write_dump(self.dump, (make_item(i) for i in range(30)))
+        self.run_import(workers=2, batch_size=7)
+
+        self.assertEqual(
+            list(Article.objects.order_by("pk").values_list("title", flat=True)),
+            [f"Post {i}" for i in range(30)],
+        )
+
+    def test_noinput(self):
+        write_dump(self.dump, [make_item(0)])
+        with mock.patch("builtins.input", side_effect=AssertionError("prompted")):
+            call_command(
+                "wordpress", self.dump, interactive=False, stdout=io.StringIO()
+            )
+        self.assertEqual(Article.objects.count(), 1)
+
+
+class WordpressSyncTestCase(TransactionTestCase):
+    def setUp(self):
+        SluglineUser.objects.create(username="admin", is_superuser=True)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.dump = os.path.join(directory, "dump.xml")
+        self.checkpoint = self.dump + ".checkpoint"
+
+    def sync(self, **options):
+        stdout = io.StringIO()
+        # Syncs never prompt
+        with mock.patch("builtins.input", side_effect=AssertionError("prompted")):
+            call_command(
+                "wordpress",
+                self.dump,
+                sync=True,
+                stdout=stdout,
+                stderr=io.StringIO(),
+                **options,
+            )
+        return stdout.getvalue()
+
+    def titles(self):
+        return list(Article.objects.order_by("pk").values_list("title", flat=True))
+
+    def test_sync(self):
+        write_dump(self.dump, (make_item(i) for i in range(3)))
+        self.sync()
+        ids = list(Article.objects.order_by("pk").values_list("pk", flat=True))
+        Article.objects.filter(pk=ids[0]).update(status=Article.Status.OKAYED)
+
+        write_dump(
+            self.dump,
+            [
+                make_item(0),
+                make_item(1, content="Changed\n\n<em>Someone</em>"),
+                make_item(2),
+                make_item(3, issue="v150i2"),
+            ],
+        )
+        stdout = self.sync()
+
+        self.assertIn("(1 new, 1 changed), 2 unchanged", stdout)
+        articles = Article.objects.with_content().order_by("pk")
+        self.assertEqual([article.pk for article in articles[:3]], ids)
+        self.assertEqual(articles[0].status, Article.Status.OKAYED)
+        self.assertEqual(articles[1].author, "Someone")
+        self.assertEqual(articles[1].content_plain, "Changed")
+        self.assertEqual(
+            list(Article.objects.filter(ARTICLE_SEARCH_INDEX.search(["Changed"]))),
+            [articles[1]],
+        )
+        self.assertEqual(articles[3].issue.short_name(), "v150i2")
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_sync_keeps_other_articles(self):
+        write_dump(self.dump, [make_item(0)])
+        self.sync()
+        write_dump(self.dump, [make_item(1)])
+        self.sync()
+        self.assertEqual(self.titles(), ["Post 0", "Post 1"])
+
+    def test_first_sync_adopts_legacy_articles(self):
+        write_dump(self.dump, (make_item(i) for i in range(3)))
+        with mock.patch("builtins.input", return_value=""):
+            call_command("wordpress", self.dump, stdout=io.StringIO())
+        # As imported before GUIDs were kept
+        Article.objects.update(wordpress_guid=None, content_hash="")
+        ids = list(Article.objects.order_by("pk").values_list("pk", flat=True))
+
+        write_dump(self.dump, [make_item(0), make_item(1), make_item(3)])
+        stdout = self.sync()
+
+        self.assertIn("(1 new, 2 changed), 0 unchanged", stdout)
+        self.assertEqual(self.titles(), ["Post 0", "Post 1", "Post 2", "Post 3"])
+        self.assertEqual(
+            list(Article.objects.order_by("pk").values_list("pk", flat=True)[:3]), ids
+        )
+        self.assertEqual(
+            list(
+                Article.objects.order_by("pk").values_list("wordpress_guid", flat=True)
+            ),
+            [
+                "https://mathnews.uwaterloo.ca/?p=0",
+                "https://mathnews.uwaterloo.ca/?p=1",
+                None,
+                "https://mathnews.uwaterloo.ca/?p=3",
+            ],
+        )
+        self.assertIn("(0 new, 0 changed), 3 unchanged", self.sync())
+
+    def test_sync_resumes_from_checkpoint(self):
+        write_dump(self.dump, (make_item(i) for i in range(5)))
+        with open(self.checkpoint, "w") as f:
+            json.dump({"dump": checkpoint_key(self.dump), "position": 3}, f)
+
+        self.assertIn("Resuming from item 3", self.sync())
+        self.assertEqual(self.titles(), ["Post 3", "Post 4"])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_sync_ignores_checkpoint_of_other_dump(self):
+        write_dump(self.dump, (make_item(i) for i in range(5)))
+        with open(self.checkpoint, "w") as f:
+            json.dump({"dump": [1, 2], "position": 3}, f)
+
+        self.sync()
+        self.assertEqual(len(self.titles()), 5)
+
+    def test_interrupted_sync_resumes(self):
+        write_dump(self.dump, (make_item(i) for i in range(25)))
+        bulk_create = Article.objects.bulk_create
+
+        def fail_third_batch(batch, *args, **kwargs):
+            if batch and batch[0].title == "Post 20":
+                raise RuntimeError("database went away")
+            return bulk_create(batch, *args, **kwargs)
+
+        with mock.patch.object(Article.objects, "bulk_create", fail_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.sync(batch_size=10)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["position"], 20)
+
+        self.assertIn("Resuming from item 20", self.sync(batch_size=10))
+        self.assertEqual(self.titles(), [f"Post {i}" for i in range(25)])
+
+
+@skipUnless((os.cpu_count() or 1) >= 2, "needs more than one CPU")
+class NormalizeBenchmarkTestCase(TestCase):
+    def test_benchmark_normalize(self):
+        """Times normalizing a synthetic dump serially and across every CPU. The times are only logged, as they depend
+        too much on the machine to assert on.
+        """
+        paragraphs = "\n\n".join(
+            f"Paragraph {i} with <b>bold</b>, <a href='/{i}'>a link</a> and <em>emphasis</em>"
+            for i in range(50)
+        )
+        posts = [
+            {"title": f"Post {i}", "content": f"{paragraphs}\n\n<em>Author</em>"}
+            for i in range(200)
+        ]
+
+        def normalize(workers):
+            return lambda: list(
+                imap_bounded(
+                    normalize_post, (dict(post) for post in posts), workers=workers
+                )
+            )
+
+        workers = os.cpu_count()
+        benchmark("wordpress normalize (1 worker)", normalize(1))
+        benchmark(f"wordpress normalize ({workers} workers)", normalize(workers))
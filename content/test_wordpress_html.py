@@ -0,0 +1,131 @@
+import copy
+from unittest import mock, skipUnless
+
+from bs4 import BeautifulSoup, NavigableString
+from bs4.builder import builder_registry
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from common.benchmarks import benchmark
+from content.management.commands.wordpress import (
+    HTML_PARSERS,
+    is_block_element,
+    parse_wordpress_html,
+)
+from content.text import html_to_text
+
+
+AVAILABLE_PARSERS = [
+    parser for parser in HTML_PARSERS if builder_registry.lookup(parser) is not None
+]
+
+SAMPLE_POSTS = [
+    "Just one paragraph.\n\n<em>A Goose</em>",
+    "First paragraph of a rant.\n\nSecond paragraph, with <strong>bold</strong> and <em>italic</em> words."
+    "\n\nThird paragraph.\n\n<em>Angry Undergrad</em>",
+    "<p>Already in paragraphs.</p>\n<p>With <a href='https://mathnews.uwaterloo.ca/'>a link</a>.</p>\n\n"
+    "<em>Linker</em>",
+    "A paragraph broken by <b>an inline element</b> and continued\n\nuntil here.\n\n<em>Continuity</em>",
+    "Top 5 reasons:\n<ol>\n<li>One</li>\n<li>Two &amp; a half</li>\n<li>Three</li>\n</ol>\n"
+    "And that's all.\n\n<em>Listicle</em>",
+    "<blockquote>Words of wisdom</blockquote>\n\nResponse to said wisdom.\n\n"
+    "<img class='aligncenter' src='https://mathnews.uwaterloo.ca/wp-content/goose.png' alt='goose' />\n\n"
+    "<em>Quoter</em>",
+    "<h2>A Heading</h2>\nx &lt; y and y &gt; z, été \U0001F600\n\n<i>Unicode</i>",
+    "Line one<br />\nLine two<br />\nLine three\n\n<em>Poet</em>",
+]
+
+
+def reference_parse_wordpress_html(content):
+    """The original html.parser and prettify() implementation, which the normalizers must agree with."""
+    content_soup = BeautifulSoup(content, features="html.parser")
+    new_soup = BeautifulSoup(features="html.parser")
+    for elem in content_soup.children:
+        if isinstance(elem, NavigableString):
+            paras = str(elem).split("\n\n")
+            try:
+                if new_soup.contents[-1].name == "p" and not is_block_element(
+                    new_soup.contents[-1].contents[-1]
+                ):
+                    new_soup.contents[-1].append(paras[0])
+                    paras = paras[1:]
+            except IndexError:
+                pass
+            for para in paras:
+                p_tag = new_soup.new_tag("p")
+                p_tag.string = para.strip()
+                new_soup.append(p_tag)
+        elif is_block_element(elem):
+            new_soup.append(copy.copy(elem))
+        else:
+            if len(new_soup.contents) == 0:
+                p_tag = new_soup.new_tag("p")
+                p_tag.append(copy.copy(elem))
+                new_soup.append(p_tag)
+            else:
+                new_soup.contents[-1].append(copy.copy(elem))
+    author_tag = new_soup.contents[-1].extract()
+    return new_soup.prettify(), author_tag.text
+
+
+class WordpressHTMLTestCase(TestCase):
+    def test_missing_parser_is_an_error(self):
+        with mock.patch.object(builder_registry, "lookup", return_value=None):
+            with self.assertRaisesMessage(CommandError, "lxml parser is not installed"):
+                call_command("wordpress", "dump.xml", html_parser="lxml")
+
+    def test_equivalent_to_reference(self):
+        for parser in AVAILABLE_PARSERS:
+            for post in SAMPLE_POSTS:
+                with self.subTest(parser=parser, post=post):
+                    html, author = parse_wordpress_html(post, parser)
+                    reference_html, reference_author = reference_parse_wordpress_html(
+                        post
+                    )
+                    self.assertEqual(author, reference_author)
+                    # The same document, only without prettify()'s whitespace
+                    self.assertEqual(
+                        BeautifulSoup(html, features="html.parser").prettify(),
+                        reference_html,
+                    )
+                    self.assertEqual(html_to_text(html), html_to_text(reference_html))
+
+    def test_output_is_compact(self):
+        html, author = parse_wordpress_html(SAMPLE_POSTS[1])
+        self.assertEqual(
+            html,
+            "<p>First paragraph of a rant.</p><p>Second paragraph, with <strong>bold</strong> and "
+            "<em>italic</em> words.</p><p>Third paragraph.</p>",
+        )
+        self.assertEqual(author, "Angry Undergrad")
+
+    def test_space_is_only_kept_before_inline_elements(self):
+        html, author = parse_wordpress_html(
+            "Intro  <blockquote>Block</blockquote>Before <b>bold</b> after \n\nAuthor  "
+        )
+        self.assertEqual(
+            html,
+            "<p>Intro</p><blockquote>Block</blockquote><p>Before <b>bold</b> after</p>",
+        )
+        self.assertEqual(author, "Author")
+
+    @skipUnless("lxml" in AVAILABLE_PARSERS, "lxml is not installed")
+    def test_lxml_keeps_leading_text(self):
+        html, _ = parse_wordpress_html("One\n\nTwo\n\n<em>Author</em>", "lxml")
+        self.assertEqual(html, "<p>One</p><p>Two</p>")
+
+    def test_benchmark_normalize(self):
+        """Times normalizing a batch of articles with the original implementation and with each available parser. The
+        times are only logged, as they depend too much on the machine to assert on.
+        """
+        posts = SAMPLE_POSTS * 10
+
+        def run(name, parse):
+            benchmark(
+                f"wordpress html, {len(posts)} articles ({name})",
+                lambda: [parse(post) for post in posts],
+            )
+
+        run("prettify", reference_parse_wordpress_html)
+        for parser in AVAILABLE_PARSERS:
+            run(parser, lambda post: parse_wordpress_html(post, parser))
@@ -0,0 +1,187 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ETree
+import zipfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from content.models import Article
+from content.tests import ContentTestCase
+from content.xml_export import AID_NS, LINE_BREAK, render_article_xml
+
+
+def article(content, article_type="slate", **fields):
+    return {
+        "slug": "goose",
+        "title": "",
+        "sub_title": "",
+        "author": "",
+        "article_type": article_type,
+        "content_raw": content,
+        **fields,
+    }
+
+
+def pstyle(element):
+    return element.get(f"{{{AID_NS}}}pstyle")
+
+
+class XMLExportTestCase(TestCase):
+    def body(self, content, article_type="slate"):
+        if article_type == "slate":
+            content = json.dumps(content)
+        root = ETree.fromstring(render_article_xml(article(content, article_type)))
+        return root.find("Body")
+
+    def test_header(self):
+        root = ETree.fromstring(
+            render_article_xml(article("", title="A & B", author="Goose"))
+        )
+        self.assertEqual(
+            [(child.tag, child.text) for child in root],
+            [("Title", "A & B"), ("Author", "Goose"), ("Body", None)],
+        )
+        self.assertEqual(pstyle(root.find("Title")), "Title")
+
+    def test_slate(self):
+        body = self.body(
+            [
+                {"type": "heading-two", "children": [{"text": "Heading"}]},
+                {
+                    "type": "paragraph",
+                    "children": [
+                        {"text": "x", "bold": True, "italic": True},
+                        {"type": "line-break", "children": []},
+                        {
+                            "type": "link",
+                            "url": "javascript:x",
+                            "children": [{"text": "y"}],
+                        },
+                    ],
+                },
+            ]
+        )
+        heading, paragraph = body
+        self.assertEqual((pstyle(heading), heading.text), ("Heading 2", "Heading"))
+        self.assertEqual(heading.tail, "\n")
+        self.assertEqual(pstyle(paragraph), "Body")
+        self.assertEqual(paragraph.find("Bold/Italic").text, "x")
+        self.assertEqual(paragraph.find("Bold").tail, LINE_BREAK)
+        self.assertIsNone(paragraph.find("Link").get("href"))
+
+    def test_slate_deep_nesting(self):
+        # As deep as json.loads allows
+        content = (
+            '[{"type": "block-quote", "children": ' * 400
+            + '[{"text": "deep"}]'
+            + "}]" * 400
+        )
+        xml = render_article_xml(article(content))
+        self.assertEqual(xml.count(b"<Quote"), 400)
+        self.assertIn(b">deep</Quote>", xml)
+
+    def test_html(self):
+        body = self.body(
+            "<p>\n  Hello <b>bold\n <i>x</b> y</p>\n<ul><li>one<li>two</ul>"
+            "<script>alert()</script><p>a<br>b<img src='/goose.png'></p>\x01</div>",
+            "wordpress",
+        )
+        first, bullets, last = body
+        self.assertEqual(
+            ETree.tostring(first, encoding="unicode"),
+            f'<Paragraph xmlns:ns0="{AID_NS}" ns0:pstyle="Body">Hello <Bold ns0:cstyle="Bold">bold '
+            f'<Italic ns0:cstyle="Italic">x</Italic></Bold> y</Paragraph>\n',
+        )
+        self.assertEqual([item.text for item in bullets], ["one", "two"])
+        self.assertEqual(last.text, f"a{LINE_BREAK}b")
+        self.assertEqual(last.find("Image").get("href"), "/goose.png")
+        self.assertNotIn("alert", ETree.tostring(body, encoding="unicode"))
+
+    def test_html_pre_keeps_whitespace(self):
+        body = self.body("<pre>a\n  b</pre>", "wordpress")
+        self.assertEqual(body.find("Code").text, "a\n  b")
+
+    def test_render_to_xml(self):
+        result = Article(
+            title="Honk", article_type=Article.Type.WORDPRESS, content_raw="<p>Hi</p>"
+        ).render_to_xml()
+        self.assertEqual(ETree.fromstring(result).find("Body/Paragraph").text, "Hi")
+
+
+class IssueExportTestCase(ContentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.published_article.content_raw = json.dumps(
+            [{"type": "paragraph", "children": [{"text": "Published"}]}]
+        )
+        self.published_article.save()
+        Article.objects.bulk_create(
+            Article(
+                title=f"Post {i}",
+                slug=f"post-{i}",
+                article_type=Article.Type.WORDPRESS,
+                content_raw=f"<p>Post {i}</p>",
+                issue=self.published_issue,
+            )
+            for i in range(10)
+        )
+
+    def assertArchive(self, data):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            names = archive.namelist()
+            self.assertEqual(
+                names,
+                ["001-published-article.xml"]
+                + [f"{i + 2:03d}-post-{i}.xml" for i in range(10)],
+            )
+            texts = [
+                ETree.fromstring(archive.read(name)).find("Body/Paragraph").text
+                for name in names
+            ]
+        self.assertEqual(texts, ["Published"] + [f"Post {i}" for i in range(10)])
+
+    def test_export_endpoint(self):
+        self.c.force_authenticate(self.copyeditor)
+        response = self.c.get(f"/api/issues/{self.published_issue.id}/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertIn('filename="v667i1.zip"', response["Content-Disposition"])
+        self.assertTrue(response.streaming)
+        self.assertArchive(b"".join(response.streaming_content))
+
+    def test_export_endpoint_requires_copyeditor(self):
+        self.c.force_authenticate(self.contrib)
+        response = self.c.get(f"/api/issues/{self.published_issue.id}/export/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, "export.zip")
+        call_command(
+            "export_issue",
+            "v667i1",
+            output=output,
+            workers=1,
+            stdout=open(os.devnull, "w"),
+        )
+        with open(output, "rb") as f:
+            self.assertArchive(f.read())
+
+    def test_export_command_across_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, "export.zip")
+        call_command(
+            "export_issue",
+            "v667i1",
+            output=output,
+            workers=2,
+            stdout=open(os.devnull, "w"),
+        )
+        with open(output, "rb") as f:
+            self.assertArchive(f.read())
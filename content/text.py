@@ -0,0 +1,67 @@
+import json
+from html.parser import HTMLParser
+
+
+"""Tags whose contents are not text a reader would see."""
+INVISIBLE_TAGS = {"script", "style", "template"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.invisible_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in INVISIBLE_TAGS:
+            self.invisible_depth += 1
+        # Tags may separate words, as in "<p>one</p><p>two</p>", so break words at every tag
+        self.chunks.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in INVISIBLE_TAGS and self.invisible_depth:
+            self.invisible_depth -= 1
+        self.chunks.append(" ")
+
+    def handle_data(self, data):
+        if not self.invisible_depth:
+            self.chunks.append(data)
+
+
+def normalize_whitespace(text):
+    return " ".join(text.split())
+
+
+def html_to_text(html):
+    """Returns the text of an HTML fragment, without markup and with whitespace collapsed."""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return normalize_whitespace("".join(extractor.chunks))
+
+
+def slate_to_text(content):
+    """Returns the text of a serialized Slate document, with whitespace collapsed. Content that isn't valid JSON is
+    treated as plain text.
+    """
+    try:
+        nodes = json.loads(content)
+    except ValueError:
+        return normalize_whitespace(content)
+
+    chunks = []
+    # Walk the tree with an explicit stack so deeply nested documents can't hit the recursion limit
+    stack = [nodes]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if isinstance(node.get("text"), str):
+                chunks.append(node["text"])
+            else:
+                chunks.append(" ")
+                stack.append(node.get("children", []))
+        elif isinstance(node, str):
+            chunks.append(node)
+    return normalize_whitespace("".join(chunks))
@@ -1,8 +1,17 @@
 import re
 from user.groups import COPYEDITOR_GROUP
 
+from django.conf import settings
 from django.db.models import Q
-from rest_framework.exceptions import NotAuthenticated
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import NotAuthenticated, NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateModelMixin
@@ -11,11 +20,13 @@ from rest_framework.decorators import action
 from common.filters import SearchableFilterBackend
 from common.pagination import SluglinePagination
 
-from content.models import Issue, Article
+from content.covers import COLOUR_MODES, SIZES, negotiate_issue_cover
+from content.models import Issue, Article, ARTICLE_SEARCH_INDEX
 from content.serializers import (
     IssueSerializer,
     ArticleSerializer,
     ArticleContentSerializer,
+    ArticleHTMLSerializer,
 )
 from common.permissions import (
     create_permission,
@@ -43,14 +54,73 @@ def transform_issue_name(term):
         return ~Q(pk__in=[])
 
 
-class IssueViewSet(ModelViewSet):
-    queryset = Issue.objects.all()
+class IssueCoverMixin:
+    """Adds a cover route to an issue viewset, serving the issue's cover image in the best format the client
+    accepts.
+    """
+
+    def perform_content_negotiation(self, request, force=False):
+        # Image Accept headers can't be satisfied by our renderers, which only matter for error responses anyways
+        return super().perform_content_negotiation(
+            request, force=force or self.action == "cover"
+        )
+
+    @action(detail=True, methods=["GET"])
+    def cover(self, request, pk=None):
+        """Returns the cover of an issue. The size (1 or 2, defaulting to 1) and colour (RGB or LA, defaulting to
+        RGB) query parameters select the variant.
+        """
+        issue = self.get_object()
+        size = request.query_params.get("size", str(SIZES[0]))
+        colour = request.query_params.get("colour", "RGB").upper()
+        if size not in map(str, SIZES):
+            raise ValidationError({"size": ["ISSUE.COVER.INVALID_SIZE"]})
+        if colour not in COLOUR_MODES:
+            raise ValidationError({"colour": ["ISSUE.COVER.INVALID_COLOUR"]})
+
+        cover = None
+        if issue.pdf:
+            cover = negotiate_issue_cover(
+                issue.pdf.path, size, colour, request.META.get("HTTP_ACCEPT")
+            )
+        if cover is None:
+            raise NotFound("ISSUE.COVER.NOT_FOUND")
+        path, media_type, cache_key = cover
+
+        etag = '"{}"'.format(cache_key)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = FileResponse(open(path, "rb"), content_type=media_type)
+        response["ETag"] = etag
+        patch_vary_headers(response, ["Accept"])
+        # The URL stays the same when the PDF is replaced, so caches must revalidate, which the ETag keeps cheap
+        visibility = "public" if issue.published else "private"
+        patch_cache_control(response, no_cache=True, **{visibility: True})
+        return response
+
+
+class IssueViewSet(IssueCoverMixin, ModelViewSet):
+    queryset = Issue.objects.select_related("cover_render_job")
     serializer_class = IssueSerializer
     filter_backends = [SearchableFilterBackend]
+    # Article and issue writes invalidate cached counts
+    cache_count = True
     search_fields = []
     search_transformers = {"__term": transform_issue_name}
+    sort_fields = {
+        "volume_num": ("volume_num", "issue_code"),
+        "publish_date": ("publish_date",),
+    }
 
-    __articles_filter = SearchableFilterBackend(["title", "content_raw"])
+    __articles_filter = SearchableFilterBackend(
+        ["title", "content_plain"],
+        search_index=ARTICLE_SEARCH_INDEX,
+        sort_fields={
+            "status": ("status", "date_modified"),
+            "title": ("title",),
+            "date_modified": ("date_modified",),
+        },
+    )
 
     permission_classes = [
         create_permission(read_perm=IsAuthenticated, write_perm=IsEditor)
@@ -66,29 +136,58 @@ class IssueViewSet(ModelViewSet):
         """This method returns the articles associated with an issue. If the issue is not yet published and the
         requesting user is not signed in, then an error is raised.
         """
-        issue = self.get_object()
+        # The search and sort parameters are for the articles, so they can't be applied to the issue lookup
+        issue = get_object_or_404(self.get_queryset(), pk=pk)
+        self.check_object_permissions(request, issue)
         if not issue.published and not request.user.is_authenticated:
             raise NotAuthenticated()
-        issue_articles = Article.objects.filter(issue__pk=pk)
+        issue_articles = Article.objects.filter(issue=issue).for_listing()
         issue_articles = self.__articles_filter.filter_queryset(
             request, issue_articles, None
         )
         paginator = SluglinePagination()
-        page = paginator.paginate_queryset(issue_articles, request)
+        page = paginator.paginate_queryset(issue_articles, request, self)
         serialized = ArticleSerializer(
             page, many=True, context={"request": request}
         ).data
         return paginator.get_paginated_response(serialized)
 
+    @action(detail=True, methods=["GET"], permission_classes=[IsCopyeditorOrAbove])
+    def export(self, request, pk=None):
+        """Returns a zip archive of the issue's articles as InDesign XML, for layout. The archive is streamed as the
+        articles are rendered.
+        """
+        issue = self.get_object()
+        response = StreamingHttpResponse(
+            issue.xml_archive(), content_type="application/zip"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{issue}.zip"'
+        return response
 
-class PublishedIssueViewSet(ReadOnlyModelViewSet):
-    queryset = Issue.objects.filter(publish_date__isnull=False)
+
+class PublishedIssueViewSet(IssueCoverMixin, ReadOnlyModelViewSet):
+    queryset = Issue.objects.filter(publish_date__isnull=False).select_related(
+        "cover_render_job"
+    )
     serializer_class = IssueSerializer
     filter_backends = [SearchableFilterBackend]
+    cache_count = True
     search_fields = []
     search_transformers = {"__term": transform_issue_name}
+    sort_fields = {
+        "volume_num": ("volume_num", "issue_code"),
+        "publish_date": ("publish_date",),
+    }
 
-    __articles_filter = SearchableFilterBackend(["title", "content_raw"])
+    __articles_filter = SearchableFilterBackend(
+        ["title", "content_plain"],
+        search_index=ARTICLE_SEARCH_INDEX,
+        sort_fields={
+            "status": ("status", "date_modified"),
+            "title": ("title",),
+            "date_modified": ("date_modified",),
+        },
+    )
 
     @action(detail=False, methods=["GET"])
     def latest(self, request):
@@ -97,7 +196,7 @@ class PublishedIssueViewSet(ReadOnlyModelViewSet):
 
 
 class ArticleViewSet(ModelViewSet):
-    queryset = Article.objects.all()
+    queryset = Article.objects.select_related("issue")
     serializer_class = ArticleSerializer
     permission_classes = [
         create_permission(
@@ -106,8 +205,22 @@ class ArticleViewSet(ModelViewSet):
         )
     ]
     filter_backends = [SearchableFilterBackend]
-    search_fields = ["title", "content_raw"]
+    cache_count = True
+    search_fields = ["title", "content_plain"]
     search_transformers = {"is": "status"}
+    search_index = ARTICLE_SEARCH_INDEX
+    sort_fields = {
+        "issue": ("issue_id", "status", "date_modified"),
+        "title": ("title",),
+        "date_created": ("date_created",),
+        "date_modified": ("date_modified",),
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            return queryset.for_listing().visible_to(self.request.user)
+        return queryset
 
     def list(self, request, *args, **kwargs):
         # We want to disable list view for non-authenticated users
@@ -123,20 +236,49 @@ class UserArticleViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
     serializer_class = ArticleSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [SearchableFilterBackend]
-    search_fields = ["title", "content_raw"]
+    cache_count = True
+    search_fields = ["title", "content_plain"]
     search_transformers = {"is": "status"}
+    search_index = ARTICLE_SEARCH_INDEX
+    sort_fields = {
+        "title": ("title",),
+        "date_created": ("date_created",),
+        "date_modified": ("date_modified",),
+    }
 
     def get_queryset(self):
-        return Article.objects.filter(user=self.request.user)
+        articles = Article.objects.filter(user=self.request.user)
+        if self.action == "list":
+            return articles.for_listing()
+        return articles.select_related("issue")
 
 
 class ArticleContentViewSet(GenericViewSet, RetrieveModelMixin, UpdateModelMixin):
-    queryset = Article.objects.all()
+    queryset = Article.objects.with_content().select_related("issue")
     serializer_class = ArticleContentSerializer
     permission_classes = [IsArticlePublished | IsAuthenticated]
 
 
 class ArticleHTMLViewSet(GenericViewSet, RetrieveModelMixin):
-    queryset = Article.objects.all()
-    serializer_class = ArticleContentSerializer
+    # Bodies are only loaded when the rendered HTML isn't cached
+    queryset = Article.objects.select_related("issue")
+    serializer_class = ArticleHTMLSerializer
     permission_classes = [IsArticlePublished | IsAuthenticated]
+
+    def retrieve(self, request, *args, **kwargs):
+        article = self.get_object()
+        etag = '"{}"'.format(article.html_version)
+        last_modified = int(article.date_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(self.get_serializer(article).data)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        visibility = "public" if article.published else "private"
+        patch_cache_control(
+            response, max_age=settings.ARTICLE_HTML_MAX_AGE, **{visibility: True}
+        )
+        return response
@@ -0,0 +1,382 @@
+import io
+import json
+import re
+import zipfile
+from html.parser import HTMLParser
+from xml.sax.saxutils import XMLGenerator
+
+from common.parallel import imap_bounded
+from content.slate import safe_url
+from content.text import INVISIBLE_TAGS
+
+
+AID_NS = "http://ns.adobe.com/AdobeInDesign/4.0/"
+
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+"""Characters that can't appear in XML 1.0, which some old WordPress posts contain."""
+
+LINE_BREAK = "\u2028"
+"""InDesign's forced line break."""
+
+ARTICLE_XML_FIELDS = (
+    "slug",
+    "title",
+    "sub_title",
+    "author",
+    "article_type",
+    "content_raw",
+)
+"""The fields of an article that exporting it needs, as passed to render_article_xml."""
+
+
+class Element:
+    """
+    An XML element to write for some element of an article. attrs maps attribute names to either their value, or a
+    function taking the attributes of the source element (a Slate node, or an HTML tag's attributes) and returning the
+    value, or None to leave it out.
+
+    InDesign starts a new paragraph after each paragraph element, which takes its style from the element's
+    aid:pstyle, or that of the element it is nested in. Void elements have no content.
+    """
+
+    def __init__(self, name, attrs=None, paragraph=False, void=False):
+        self.name = name
+        self.attrs = attrs or {}
+        self.paragraph = paragraph
+        self.void = void
+
+    def attributes(self, source):
+        attributes = {}
+        for name, value in self.attrs.items():
+            if callable(value):
+                value = value(source)
+            if value is not None:
+                attributes[name] = _INVALID_XML_CHARS.sub("", str(value))
+        return attributes
+
+
+def paragraph(name, style=None):
+    return Element(name, {"aid:pstyle": style} if style else None, paragraph=True)
+
+
+def character(name, style):
+    return Element(name, {"aid:cstyle": style})
+
+
+HEADINGS = {level: paragraph("Heading", f"Heading {level}") for level in range(1, 7)}
+LIST_ITEM = paragraph("ListItem")
+CODE = paragraph("Code", "Code")
+BOLD = character("Bold", "Bold")
+ITALIC = character("Italic", "Italic")
+UNDERLINE = character("Underline", "Underline")
+STRIKETHROUGH = character("Strikethrough", "Strikethrough")
+INLINE_CODE = character("InlineCode", "Code")
+SUPERSCRIPT = character("Superscript", "Superscript")
+SUBSCRIPT = character("Subscript", "Subscript")
+
+SLATE_ELEMENTS = {
+    "paragraph": paragraph("Paragraph", "Body"),
+    "heading-one": HEADINGS[1],
+    "heading-two": HEADINGS[2],
+    "heading-three": HEADINGS[3],
+    "heading-four": HEADINGS[4],
+    "heading-five": HEADINGS[5],
+    "heading-six": HEADINGS[6],
+    "block-quote": paragraph("Quote", "Quote"),
+    "bulleted-list": paragraph("BulletedList", "Bulleted List"),
+    "numbered-list": paragraph("NumberedList", "Numbered List"),
+    "list-item": LIST_ITEM,
+    "code-block": CODE,
+    "link": Element("Link", {"href": lambda node: safe_url(node.get("url"))}),
+    "image": Element(
+        "Image", {"href": lambda node: safe_url(node.get("url"))}, void=True
+    ),
+    "line-break": LINE_BREAK,
+}
+"""
+What to write for each type of Slate element: an Element, or a string to write as text. Elements of unknown types
+are written as just their children.
+"""
+
+SLATE_MARKS = {
+    "bold": BOLD,
+    "italic": ITALIC,
+    "underline": UNDERLINE,
+    "strikethrough": STRIKETHROUGH,
+    "code": INLINE_CODE,
+    "superscript": SUPERSCRIPT,
+    "subscript": SUBSCRIPT,
+}
+"""Elements for each mark a Slate text leaf can have, outermost first."""
+
+HTML_ELEMENTS = {
+    "p": paragraph("Paragraph", "Body"),
+    "h1": HEADINGS[1],
+    "h2": HEADINGS[2],
+    "h3": HEADINGS[3],
+    "h4": HEADINGS[4],
+    "h5": HEADINGS[5],
+    "h6": HEADINGS[6],
+    "blockquote": paragraph("Quote", "Quote"),
+    "ul": paragraph("BulletedList", "Bulleted List"),
+    "ol": paragraph("NumberedList", "Numbered List"),
+    "li": LIST_ITEM,
+    "pre": CODE,
+    "div": paragraph("Paragraph"),
+    "strong": BOLD,
+    "b": BOLD,
+    "em": ITALIC,
+    "i": ITALIC,
+    "u": UNDERLINE,
+    "s": STRIKETHROUGH,
+    "del": STRIKETHROUGH,
+    "strike": STRIKETHROUGH,
+    "code": INLINE_CODE,
+    "sup": SUPERSCRIPT,
+    "sub": SUBSCRIPT,
+    "a": Element("Link", {"href": lambda attrs: safe_url(attrs.get("href"))}),
+    "img": Element(
+        "Image", {"href": lambda attrs: safe_url(attrs.get("src"))}, void=True
+    ),
+    "br": LINE_BREAK,
+}
+"""What to write for each HTML tag, as in SLATE_ELEMENTS. Unknown tags are written as just their contents."""
+
+ARTICLE = Element("Article", {"xmlns:aid": AID_NS})
+HEADER = {
+    "title": paragraph("Title", "Title"),
+    "sub_title": paragraph("Subtitle", "Subtitle"),
+    "author": paragraph("Author", "Author"),
+}
+BODY = Element("Body")
+
+
+class InDesignXMLWriter:
+    """
+    Writes XML for InDesign to import to a stream as it is generated. Nothing is indented, since InDesign imports
+    whitespace as text; a line break after each paragraph separates them instead.
+    """
+
+    def __init__(self, out):
+        self.xml = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+        self.open = []
+        self.at_paragraph_start = True
+
+    def start_document(self):
+        self.xml.startDocument()
+        self.start(ARTICLE)
+
+    def end_document(self):
+        while self.open:
+            self.end()
+        self.xml.endDocument()
+
+    def start(self, element, source=None):
+        if element.paragraph:
+            self.end_paragraph()
+        self.xml.startElement(element.name, element.attributes(source or {}))
+        if element.void:
+            self.xml.endElement(element.name)
+            self.at_paragraph_start = False
+        else:
+            self.open.append(element)
+
+    def end(self):
+        element = self.open.pop()
+        self.xml.endElement(element.name)
+        if element.paragraph:
+            self.end_paragraph()
+
+    def end_paragraph(self):
+        if not self.at_paragraph_start:
+            self.xml.characters("\n")
+            self.at_paragraph_start = True
+
+    def text(self, text):
+        text = _INVALID_XML_CHARS.sub("", text)
+        if text:
+            self.xml.characters(text)
+            self.at_paragraph_start = False
+
+
+def write_slate(content, writer):
+    try:
+        nodes = json.loads(content)
+    except ValueError:
+        if content:
+            writer.start(SLATE_ELEMENTS["paragraph"])
+            writer.text(content)
+            writer.end()
+        return
+
+    marks = list(SLATE_MARKS.items())
+    # None marks where an element's children end
+    stack = [nodes]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            writer.end()
+        elif isinstance(node, str):
+            writer.text(node)
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if isinstance(node.get("text"), str):
+                leaf_marks = [element for mark, element in marks if node.get(mark)]
+                for element in leaf_marks:
+                    writer.start(element)
+                writer.text(node["text"])
+                for _ in leaf_marks:
+                    writer.end()
+                continue
+            element = SLATE_ELEMENTS.get(node.get("type"))
+            if isinstance(element, str):
+                writer.text(element)
+            elif element is None:
+                stack.append(node.get("children", []))
+            else:
+                writer.start(element, node)
+                if not element.void:
+                    stack.append(None)
+                    stack.append(node.get("children", []))
+
+
+class _HTMLConverter(HTMLParser):
+    """Feeds HTML to an InDesignXMLWriter. Tags that are left open are closed when an enclosing tag is, and stray
+    closing tags are ignored, so the XML is well formed whatever the HTML.
+    """
+
+    def __init__(self, writer):
+        super().__init__(convert_charrefs=True)
+        self.writer = writer
+        self.open_tags = []
+        self.invisible_depth = 0
+        self.pre_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in INVISIBLE_TAGS:
+            self.invisible_depth += 1
+            return
+        element = HTML_ELEMENTS.get(tag)
+        if isinstance(element, str):
+            self.writer.text(element)
+        elif element is not None:
+            if element.paragraph:
+                self.close_implied(tag)
+            self.writer.start(element, dict(attrs))
+            if not element.void:
+                self.open_tags.append(tag)
+                if tag == "pre":
+                    self.pre_depth += 1
+
+    def close_implied(self, tag):
+        """HTML lets paragraphs and list items be left open, to end where the next one starts."""
+        implied = "li" if tag == "li" else "p"
+        for open_tag in reversed(self.open_tags):
+            if open_tag == implied:
+                self.handle_endtag(open_tag)
+                return
+            if open_tag != "p" and HTML_ELEMENTS[open_tag].paragraph:
+                return
+
+    def handle_endtag(self, tag):
+        if tag in INVISIBLE_TAGS:
+            self.invisible_depth = max(self.invisible_depth - 1, 0)
+            return
+        if tag not in self.open_tags:
+            return
+        while True:
+            closed = self.open_tags.pop()
+            self.writer.end()
+            if closed == "pre":
+                self.pre_depth -= 1
+            if closed == tag:
+                return
+
+    def handle_data(self, data):
+        if self.invisible_depth:
+            return
+        if not self.pre_depth:
+            # Source whitespace, e.g. from prettify(), isn't meant to be seen
+            data = re.sub(r"\s+", " ", data)
+            if self.writer.at_paragraph_start:
+                data = data.lstrip()
+        self.writer.text(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.open_tags.pop()
+            self.writer.end()
+
+
+def write_html(content, writer):
+    converter = _HTMLConverter(writer)
+    converter.feed(content)
+    converter.close()
+
+
+CONTENT_WRITERS = {"wordpress": write_html, "slate": write_slate}
+"""Writers for the body of each type of article."""
+
+
+def write_article_xml(article, out):
+    """Writes an article as InDesign XML to out. article is a dict of ARTICLE_XML_FIELDS, so that it can be sent to
+    other processes.
+    """
+    writer = InDesignXMLWriter(out)
+    writer.start_document()
+    for field, element in HEADER.items():
+        if article[field]:
+            writer.start(element)
+            writer.text(article[field])
+            writer.end()
+    writer.start(BODY)
+    CONTENT_WRITERS[article["article_type"]](article["content_raw"], writer)
+    writer.end_document()
+
+
+def render_article_xml(article):
+    """Returns an article as UTF-8 encoded InDesign XML; see write_article_xml."""
+    out = io.BytesIO()
+    write_article_xml(article, out)
+    return out.getvalue()
+
+
+def _render_archive_entry(article):
+    return article["slug"], render_article_xml(article)
+
+
+class _ChunkBuffer:
+    """A write-only stream that collects what's written until it is taken."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_issue_archive(articles, workers):
+    """
+    Yields the bytes of a zip archive with an XML file for each of articles, an iterable of dicts of
+    ARTICLE_XML_FIELDS. Articles are rendered across a pool of workers processes, and each is yielded as soon as it is
+    rendered and compressed, so neither the articles nor the archive are ever held in memory in full.
+    """
+    buffer = _ChunkBuffer()
+    # An unseekable stream, so the archive is written strictly front to back
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        rendered = imap_bounded(_render_archive_entry, articles, workers=workers)
+        for index, (slug, xml) in enumerate(rendered, start=1):
+            archive.writestr("{:03d}-{}.xml".format(index, slug or "article"), xml)
+            yield buffer.take()
+    yield buffer.take()
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "common.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -149,6 +150,57 @@ STATICFILES_FINDERS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Issue cover rendering. COVER_RENDER_MODE is one of:
+# - "thread": render in a background thread pool of the web process, for small deployments
+# - "worker": leave jobs in the queue for `manage.py render_covers`
+# - "sync": render while the issue is being saved
+
+COVER_RENDER_MODE = "thread"
+COVER_RENDER_THREADS = 1
+# Processes used to encode the cover images of a single render; 1 encodes them in the rendering thread. Renders in
+# the web process use this; `manage.py render_covers` takes --workers instead.
+COVER_ENCODE_PROCESSES = 1
+# Formats covers are produced in besides PNG, and their encoder quality. Formats the installed Pillow can't encode
+# (AVIF needs Pillow 11.2 or pillow-avif-plugin) are skipped.
+COVER_FORMATS = ["webp", "avif"]
+COVER_QUALITY = {"webp": 80, "avif": 60}
+
+# Full-text search; one of "auto", "sqlite", "postgres" or "none". See common.search_index.FullTextIndex.
+
+SEARCH_INDEX_BACKEND = "auto"
+
+# Search query parser; "fast" for the hand-written parser, or "pyparsing" for the reference implementation
+
+SEARCH_PARSER = "fast"
+
+# Paginated list counts. PAGINATION_COUNT_MODE is "exact" for a full COUNT(*), or "estimated" to stop counting at
+# PAGINATION_COUNT_CAP rows (or use the planner's estimate on PostgreSQL), in which case responses set
+# `count_estimated`. Views can override the mode with `count_mode`. Views that set `cache_count` (those listing
+# articles and issues) cache their counts for up to PAGINATION_COUNT_CACHE_TIMEOUT seconds, or until an article or
+# issue is written. Writes invalidate counts through the default cache, so with more than one server process it must
+# be shared between them, e.g. memcached or Redis rather than the per-process LocMemCache.
+
+PAGINATION_COUNT_MODE = "exact"
+PAGINATION_COUNT_CAP = 1000
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+
+# Rendered article HTML is cached in the ARTICLE_HTML_CACHE cache for ARTICLE_HTML_CACHE_TIMEOUT seconds, and clients
+# and CDNs may reuse it for ARTICLE_HTML_MAX_AGE seconds before revalidating
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+ARTICLE_HTML_CACHE = "default"
+ARTICLE_HTML_CACHE_TIMEOUT = 60 * 60 * 24
+ARTICLE_HTML_MAX_AGE = 60
+
+# Processes used to render articles to XML when exporting a whole issue; 1 renders them in the request. Exports in the
+# web process use this; `manage.py export_issue` takes --workers instead.
+
+XML_EXPORT_PROCESSES = 1
+
 # Django Rest Framework settings
 
 REST_FRAMEWORK = {
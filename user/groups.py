@@ -1,4 +1,8 @@
 from django.contrib.auth.models import Group
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+import threading
 
 EDITOR_GROUP = "Editor"
 COPYEDITOR_GROUP = "Copyeditor"
@@ -11,6 +15,38 @@ GROUPS = {
 }
 
 
+_groups_by_name = {}
+_groups_by_name_lock = threading.Lock()
+
+
+def get_groups(names):
+    """Returns a dict of the named groups. Groups are cached for the life of the process, and any not yet cached are
+    loaded in one query. Raises Group.DoesNotExist if a group does not exist.
+    """
+    names = set(names)
+    missing = names - _groups_by_name.keys()
+    if missing:
+        with _groups_by_name_lock:
+            for group in Group.objects.filter(name__in=missing):
+                _groups_by_name[group.name] = group
+        missing = names - _groups_by_name.keys()
+        if missing:
+            raise Group.DoesNotExist(f"No groups named {', '.join(sorted(missing))}")
+    return {name: _groups_by_name[name] for name in names}
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def clear_group_cache(**kwargs):
+    with _groups_by_name_lock:
+        _groups_by_name.clear()
+
+
+def role_groups(role):
+    """Returns the names of the groups a user with the given role is in."""
+    return {role, *GROUPS[role]}
+
+
 def create_default_groups():
     editor, _ = Group.objects.get_or_create(name=EDITOR_GROUP)
     copyeditor, _ = Group.objects.get_or_create(name=COPYEDITOR_GROUP)
@@ -21,5 +57,13 @@ def create_default_groups():
     editor.permissions.clear()
 
 
+def highest_role(roles):
+    """Returns the highest of the given roles; every user is at least a contributor."""
+    for role in (EDITOR_GROUP, COPYEDITOR_GROUP):
+        if role in roles:
+            return role
+    return CONTRIBUTOR_GROUP
+
+
 def role_at_least(role, minimum):
     return minimum == role or minimum in GROUPS.get(role, [])
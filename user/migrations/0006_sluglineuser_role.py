@@ -0,0 +1,53 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+# user.groups.highest_role as of this migration, copied so that later changes to it don't change what this migration
+# does
+def highest_role(groups):
+    for role in ("Editor", "Copyeditor"):
+        if role in groups:
+            return role
+    return "Contributor"
+
+
+def fill_role(apps, schema_editor):
+    SluglineUser = apps.get_model("user", "SluglineUser")
+    memberships = SluglineUser.groups.through.objects.values_list(
+        "sluglineuser_id", "group__name"
+    )
+    groups = {}
+    for user_pk, group in memberships:
+        groups.setdefault(user_pk, set()).add(group)
+
+    users_by_role = {}
+    for user_pk, names in groups.items():
+        users_by_role.setdefault(highest_role(names), []).append(user_pk)
+    for role, user_pks in users_by_role.items():
+        SluglineUser.objects.filter(pk__in=user_pks).update(role=role)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0005_sluglineuser_password_reset_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sluglineuser",
+            name="role",
+            field=models.CharField(
+                choices=[
+                    ("Contributor", "Contributor"),
+                    ("Copyeditor", "Copyeditor"),
+                    ("Editor", "Editor"),
+                ],
+                db_index=True,
+                default="Contributor",
+                max_length=32,
+            ),
+        ),
+        migrations.RunPython(fill_role, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0006_sluglineuser_role"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sluglineuser",
+            index=models.Index(fields=["first_name"], name="user_first_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sluglineuser",
+            index=models.Index(fields=["last_name"], name="user_last_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sluglineuser",
+            index=models.Index(fields=["writer_name"], name="user_writer_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sluglineuser",
+            index=models.Index(fields=["email"], name="user_email_idx"),
+        ),
+    ]
@@ -1,21 +1,36 @@
-from django.db import models
+from django.contrib.auth.hashers import make_password
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.contrib.auth.models import AbstractUser, Group
+from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.password_validation import validate_password
 
 from rest_framework import serializers
 
+from common.serializers import TimedSerializerMixin
+
 from user.groups import (
     GROUPS,
-    EDITOR_GROUP,
-    COPYEDITOR_GROUP,
     CONTRIBUTOR_GROUP,
+    get_groups,
+    highest_role,
     role_at_least,
+    role_groups,
 )
 
-FORBIDDEN_USERNAMES = {"admin", "administrator", "root", "toor", "sudo", "sudoers"}
+# "import" would be shadowed by the users/import/ endpoint
+FORBIDDEN_USERNAMES = {
+    "admin",
+    "administrator",
+    "root",
+    "toor",
+    "sudo",
+    "sudoers",
+    "import",
+}
 
 
 class SluglineUser(AbstractUser):
@@ -24,22 +39,14 @@ class SluglineUser(AbstractUser):
     writer_name = models.CharField(max_length=255)
     """Uniquely generated token to reset password"""
     password_reset_token = models.CharField(max_length=128, default="")
-
-    @property
-    def role(self):
-        """Returns the highest role that a user has."""
-        if self.groups.filter(name=EDITOR_GROUP).exists():
-            return EDITOR_GROUP
-        elif self.groups.filter(name=COPYEDITOR_GROUP).exists():
-            return COPYEDITOR_GROUP
-        else:
-            return CONTRIBUTOR_GROUP
-
-    # We write a setter as we construct temporary users when doing password validation, and sometimes role information
-    # is part of the data.
-    @role.setter
-    def role(self, value):
-        pass
+    """The highest role that a user has, kept in sync with their groups by update_role so that reading it doesn't
+    query them."""
+    role = models.CharField(
+        max_length=32,
+        choices=[(role, role) for role in GROUPS],
+        default=CONTRIBUTOR_GROUP,
+        db_index=True,
+    )
 
     def at_least(self, minimum):
         """Returns if a user has at least a given role's privileges"""
@@ -47,9 +54,105 @@ class SluglineUser(AbstractUser):
 
     class Meta:
         ordering = ["date_joined"]
+        # These back the sorts that UserViewSet allows
+        indexes = [
+            models.Index(fields=["first_name"], name="user_first_name_idx"),
+            models.Index(fields=["last_name"], name="user_last_name_idx"),
+            models.Index(fields=["writer_name"], name="user_writer_name_idx"),
+            models.Index(fields=["email"], name="user_email_idx"),
+        ]
+
+
+@receiver(m2m_changed, sender=SluglineUser.groups.through)
+def update_role(sender, instance, action, reverse, pk_set, **kwargs):
+    """Updates the role of users whose groups changed."""
+    if reverse:
+        # Groups were changed from the group's side, e.g. group.user_set.add(user)
+        if action == "pre_clear":
+            instance._cleared_user_pks = set(
+                instance.user_set.values_list("pk", flat=True)
+            )
+            return
+        if action == "post_clear":
+            pk_set = instance.__dict__.pop("_cleared_user_pks", set())
+        elif action not in ("post_add", "post_remove"):
+            return
+        users = SluglineUser.objects.filter(pk__in=pk_set)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        users = [instance]
+    else:
+        return
+
+    for user in users:
+        role = highest_role(set(user.groups.values_list("name", flat=True)))
+        if role != user.role or user is instance:
+            user.role = role
+            SluglineUser.objects.filter(pk=user.pk).update(role=role)
+
+
+def assign_roles(assignments):
+    """Gives each user in a list of (user, role) pairs the groups of their role, and takes away other role groups,
+    in a constant number of queries however many users there are. Groups that aren't roles are left alone.
+    """
+    assignments = [(user, role) for user, role in assignments if role in GROUPS]
+    if not assignments:
+        return
+    groups = get_groups(GROUPS)
+    role_group_pks = [group.pk for group in groups.values()]
+    Membership = SluglineUser.groups.through
+
+    with transaction.atomic():
+        # Bulk changes don't send m2m_changed, so roles are updated here instead of by update_role
+        Membership.objects.filter(
+            sluglineuser_id__in=[user.pk for user, _ in assignments],
+            group_id__in=role_group_pks,
+        ).delete()
+        Membership.objects.bulk_create(
+            Membership(sluglineuser_id=user.pk, group_id=groups[name].pk)
+            for user, role in assignments
+            for name in role_groups(role)
+        )
+
+        users_by_role = {}
+        for user, role in assignments:
+            user.role = role
+            users_by_role.setdefault(role, []).append(user.pk)
+        for role, user_pks in users_by_role.items():
+            SluglineUser.objects.filter(pk__in=user_pks).update(role=role)
+
+
+def assign_role(user, role):
+    assign_roles([(user, role)])
+
+
+def create_users(users_data):
+    """Creates users from a list of validated UserSerializer data, all in one transaction."""
+    users_data = [dict(data) for data in users_data]
+    roles = [data.pop("role", CONTRIBUTOR_GROUP) for data in users_data]
+    passwords = [make_password(data.pop("password")) for data in users_data]
+    users = [
+        SluglineUser(password=password, **data)
+        for data, password in zip(users_data, passwords)
+    ]
 
+    with transaction.atomic():
+        SluglineUser.objects.bulk_create(users)
+        # Not every database returns the primary keys of bulk created rows
+        pks = dict(
+            SluglineUser.objects.filter(
+                username__in=[user.username for user in users]
+            ).values_list("username", "pk")
+        )
+        for user in users:
+            user.pk = pks[user.username]
+        assign_roles(
+            (user, role if role in GROUPS else CONTRIBUTOR_GROUP)
+            for user, role in zip(users, roles)
+        )
+    return users
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     role = serializers.CharField(default=CONTRIBUTOR_GROUP)
 
     def create(self, validated_data):
@@ -62,16 +165,13 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"username": ["USER.USERNAME.ALREADY_EXISTS"]}
             )
-        user = SluglineUser.objects.create(**validated_data)
+        # The role is set through the user's groups
+        role = validated_data.pop("role", CONTRIBUTOR_GROUP)
+        user = SluglineUser(**validated_data)
         user.set_password(validated_data["password"])
-        user.save()
-
-        user.groups.add(Group.objects.get(name=CONTRIBUTOR_GROUP))
-
-        if validated_data["role"] in GROUPS:
-            for base_role in GROUPS[validated_data["role"]]:
-                user.groups.add(Group.objects.get(name=base_role))
-            user.groups.add(Group.objects.get(name=validated_data["role"]))
+        with transaction.atomic():
+            user.save()
+            assign_role(user, role if role in GROUPS else CONTRIBUTOR_GROUP)
 
         return user
 
@@ -84,17 +184,11 @@ class UserSerializer(serializers.ModelSerializer):
         instance.email = validated_data.get("email", instance.email)
         instance.writer_name = validated_data.get("writer_name", instance.writer_name)
 
-        instance.save()
-
-        if validated_data.get("role") in GROUPS:
-            new_roles = {validated_data["role"], *GROUPS[validated_data["role"]]}
-            current_roles = set(instance.groups.values_list("name", flat=True))
-
-            for obsolete_role in current_roles - new_roles:
-                instance.groups.remove(Group.objects.get(name=obsolete_role))
-
-            for new_role in new_roles - current_roles:
-                instance.groups.add(Group.objects.get(name=new_role))
+        role = validated_data.get("role")
+        with transaction.atomic():
+            instance.save()
+            if role in GROUPS and role != instance.role:
+                assign_role(instance, role)
 
         return instance
 
@@ -0,0 +1,161 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from common.middleware import QueryMetrics
+from common.testing import QueryBudgetMixin
+from user.groups import CONTRIBUTOR_GROUP, EDITOR_GROUP, create_default_groups
+from user.models import SluglineUser, assign_role, assign_roles
+
+
+class UserQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """Pins how many queries each user route may run, and checks that listing more users doesn't take more."""
+
+    def setUp(self) -> None:
+        create_default_groups()
+        self.editor = SluglineUser.objects.create(username="editor")
+        self.editor.set_password("editor password")
+        self.editor.save()
+        assign_role(self.editor, EDITOR_GROUP)
+        self.added = 0
+        self.add_users()
+        self.c = APIClient()
+
+    def add_users(self):
+        users = [
+            SluglineUser.objects.create(username=f"user{self.added + i}")
+            for i in range(10)
+        ]
+        self.added += len(users)
+        assign_roles((user, CONTRIBUTOR_GROUP) for user in users)
+
+    def assertBudget(self, url, budget, user=None, status_code=200):
+        self.c.force_authenticate(user)
+
+        def get():
+            cache.clear()
+            with self.assertMaxQueries(budget):
+                response = self.c.get(url)
+            self.assertEqual(response.status_code, status_code)
+
+        self.assertQueriesDoNotScale(get, self.add_users)
+
+    def test_users(self):
+        self.assertBudget("/api/users/", 2, self.editor)
+        self.assertBudget("/api/users/?search=is:contributor", 2, self.editor)
+        self.assertBudget("/api/users/user0/", 1, self.editor)
+        self.assertBudget("/api/users/nobody/query/", 1, self.editor)
+
+    def test_me(self):
+        self.assertBudget("/api/me/", 0, self.editor)
+        self.assertBudget("/api/me/", 0)
+
+    def test_login(self):
+        # The user, and creating and saving the session
+        with self.assertMaxQueries(9):
+            response = self.c.post(
+                "/api/login/", {"username": "editor", "password": "editor password"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        # A session is loaded along with its user, and reading the role doesn't query groups
+        with self.assertMaxQueries(2):
+            self.assertEqual(self.c.get("/api/me/").data["role"], EDITOR_GROUP)
+
+    def test_logout(self):
+        self.c.force_login(self.editor)
+        with self.assertMaxQueries(4):
+            response = self.c.post("/api/logout/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_password(self):
+        self.c.force_authenticate(self.editor)
+        with self.assertMaxQueries(2):
+            token = self.c.post("/api/users/user0/reset_password/").data
+        self.c.force_authenticate(None)
+
+        with self.assertMaxQueries(1):
+            response = self.c.get("/api/reset_password/", {"token": token})
+        self.assertEqual(response.status_code, 200)
+        with self.assertMaxQueries(4):
+            response = self.c.post(
+                "/api/reset_password/",
+                {"token": token, "password": "a long enough password"},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_writes(self):
+        self.c.force_authenticate(self.editor)
+        with self.assertMaxQueries(11):
+            response = self.c.post(
+                "/api/users/",
+                {
+                    "username": "new",
+                    "password": "a long enough password",
+                    "email": "new@example.com",
+                    "writer_name": "New",
+                    "role": CONTRIBUTOR_GROUP,
+                },
+            )
+        self.assertEqual(response.status_code, 201)
+        with self.assertMaxQueries(4):
+            response = self.c.patch(
+                "/api/users/new/", {"writer_name": "Newer", "role": CONTRIBUTOR_GROUP}
+            )
+        self.assertEqual(response.status_code, 200)
+        with self.assertMaxQueries(8):
+            response = self.c.delete("/api/users/new/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_import(self):
+        self.c.force_authenticate(self.editor)
+        self.imported = 0
+        self.batch_size = 5
+
+        def post():
+            users = [
+                {
+                    "username": f"new{self.imported + i}",
+                    "password": "a long enough password",
+                    "email": "new@example.com",
+                    "writer_name": "New",
+                }
+                for i in range(self.batch_size)
+            ]
+            self.imported += self.batch_size
+            with self.assertMaxQueries(10):
+                response = self.c.post("/api/users/import/", {"users": users})
+            self.assertEqual(response.status_code, 201)
+
+        # Importing more users at once doesn't take more queries
+        def grow():
+            self.batch_size = 20
+
+        self.assertQueriesDoNotScale(post, grow)
+
+
+@override_settings(DEBUG=True)
+class QueryMetricsTestCase(TestCase):
+    def test_server_timing(self):
+        response = APIClient().get("/api/me/")
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, '
+            r"render;dur=[\d.]+, total;dur=[\d.]+$",
+        )
+
+    def test_serialization_is_timed_once(self):
+        metrics = QueryMetrics()
+        with mock.patch("time.perf_counter", side_effect=[1.0, 2.0, 5.0]):
+            with metrics.serializing():
+                with metrics.serializing():
+                    pass
+
+        self.assertEqual(metrics.serialize_time, 4.0)
+
+    @override_settings(DEBUG=False)
+    def test_no_server_timing_in_production(self):
+        self.assertFalse(APIClient().get("/api/me/").has_header("Server-Timing"))
@@ -1,3 +1,173 @@
+from django.contrib.auth.models import Group
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from user.groups import (
+    COPYEDITOR_GROUP,
+    CONTRIBUTOR_GROUP,
+    EDITOR_GROUP,
+    GROUPS,
+    create_default_groups,
+    get_groups,
+    role_groups,
+)
+from user.models import SluglineUser, UserSerializer, assign_role, assign_roles
+
+
+class UserRoleTestCase(TestCase):
+    def setUp(self) -> None:
+        create_default_groups()
+        self.editor = SluglineUser.objects.create(username="editor")
+        self.editor.groups.add(Group.objects.get(name=EDITOR_GROUP))
+        self.user = SluglineUser.objects.create(username="user")
+        self.c = APIClient()
+
+    def assertRole(self, user, role):
+        self.assertEqual(user.role, role)
+        self.assertEqual(SluglineUser.objects.get(pk=user.pk).role, role)
+
+    def test_role_follows_groups(self):
+        self.assertRole(self.user, CONTRIBUTOR_GROUP)
+
+        self.user.groups.add(Group.objects.get(name=COPYEDITOR_GROUP))
+        self.assertRole(self.user, COPYEDITOR_GROUP)
+
+        self.user.groups.clear()
+        self.assertRole(self.user, CONTRIBUTOR_GROUP)
+
+    def test_role_follows_group_membership(self):
+        editors = Group.objects.get(name=EDITOR_GROUP)
+        editors.user_set.add(self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.role, EDITOR_GROUP)
+
+        editors.user_set.clear()
+        self.assertCountEqual(
+            SluglineUser.objects.values_list("role", flat=True),
+            [CONTRIBUTOR_GROUP, CONTRIBUTOR_GROUP],
+        )
+
+    def test_reading_role_does_not_query(self):
+        user = SluglineUser.objects.get(pk=self.editor.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.at_least(COPYEDITOR_GROUP))
+
+    def test_user_list_does_not_query_per_user(self):
+        for i in range(10):
+            SluglineUser.objects.create(username=f"contrib{i}")
+        self.c.force_authenticate(self.editor)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.c.get("/api/users/", {"search": "is:contributor"})
+        self.assertEqual(response.data["count"], 11)
+        self.assertLessEqual(len(queries), 2)
+
+
+class RoleAssignmentTestCase(TestCase):
+    def setUp(self) -> None:
+        create_default_groups()
+        self.editor = SluglineUser.objects.create(username="editor")
+        assign_role(self.editor, EDITOR_GROUP)
+        self.editor.set_password("editor password")
+        self.editor.save()
+        self.c = APIClient()
+        self.c.force_authenticate(self.editor)
+
+    def group_names(self, user):
+        return set(user.groups.values_list("name", flat=True))
+
+    def test_assign_role(self):
+        user = SluglineUser.objects.create(username="user")
+        user.groups.add(Group.objects.create(name="Not a role"))
+
+        assign_role(user, COPYEDITOR_GROUP)
+        self.assertEqual(
+            self.group_names(user), {"Not a role", COPYEDITOR_GROUP, CONTRIBUTOR_GROUP}
+        )
+        self.assertEqual(SluglineUser.objects.get(pk=user.pk).role, COPYEDITOR_GROUP)
+
+        assign_role(user, CONTRIBUTOR_GROUP)
+        self.assertEqual(self.group_names(user), {"Not a role", CONTRIBUTOR_GROUP})
+        self.assertEqual(user.role, CONTRIBUTOR_GROUP)
+
+    def test_assign_roles_in_constant_queries(self):
+        users = [SluglineUser.objects.create(username=f"user{i}") for i in range(20)]
+        get_groups(GROUPS)
+
+        # Two savepoint queries, a delete, an insert, and an update per role
+        with self.assertNumQueries(6):
+            assign_roles(
+                (user, [CONTRIBUTOR_GROUP, COPYEDITOR_GROUP][i % 2])
+                for i, user in enumerate(users)
+            )
+        self.assertEqual(SluglineUser.objects.filter(role=COPYEDITOR_GROUP).count(), 10)
+
+    def test_serializer_create(self):
+        serializer = UserSerializer(
+            data={
+                "username": "new",
+                "password": "a long enough password",
+                "email": "new@example.com",
+                "writer_name": "New",
+                "role": EDITOR_GROUP,
+            }
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        user = serializer.save()
+
+        self.assertEqual(user.role, EDITOR_GROUP)
+        self.assertEqual(self.group_names(user), set(role_groups(EDITOR_GROUP)))
+        self.assertTrue(user.check_password("a long enough password"))
+
+    def import_users(self, users, **data):
+        return self.c.post("/api/users/import/", {"users": users, **data})
+
+    def user(self, username, **fields):
+        return {
+            "username": username,
+            "password": "a long enough password",
+            "email": f"{username}@example.com",
+            "writer_name": username.title(),
+            **fields,
+        }
+
+    def test_bulk_import(self):
+        response = self.import_users([self.user(f"contrib{i}") for i in range(5)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 5)
+        users = SluglineUser.objects.filter(username__startswith="contrib")
+        self.assertEqual(users.count(), 5)
+        for user in users:
+            self.assertEqual(user.role, CONTRIBUTOR_GROUP)
+            self.assertEqual(self.group_names(user), {CONTRIBUTOR_GROUP})
+            self.assertTrue(user.check_password("a long enough password"))
+
+    def test_bulk_import_is_all_or_nothing(self):
+        response = self.import_users(
+            [self.user("first"), self.user("editor"), self.user("first")]
+        )
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["users"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("username", errors[1])
+        self.assertIn("username", errors[2])
+        self.assertFalse(SluglineUser.objects.filter(username="first").exists())
+
+    def test_import_is_not_a_username(self):
+        response = self.import_users([self.user("import")])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("username", response.data["users"][0])
+        self.assertEqual(self.c.get("/api/users/import/query/").status_code, 400)
+
+    def test_bulk_import_of_editors_needs_password(self):
+        users = [self.user("boss", role=EDITOR_GROUP)]
+        self.assertEqual(self.import_users(users).status_code, 500)
+
+        response = self.import_users(users, cur_password="editor password")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(SluglineUser.objects.get(username="boss").role, EDITOR_GROUP)
@@ -12,11 +12,17 @@ from rest_framework.exceptions import (
 )
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.validators import UniqueValidator
 from rest_framework.viewsets import ModelViewSet
 
 from common.filters import SearchableFilterBackend
 from common.permissions import IsEditor
-from user.models import SluglineUser, UserSerializer, FORBIDDEN_USERNAMES
+from user.models import (
+    SluglineUser,
+    UserSerializer,
+    FORBIDDEN_USERNAMES,
+    create_users,
+)
 from user.groups import EDITOR_GROUP, CONTRIBUTOR_GROUP, COPYEDITOR_GROUP
 
 from math import ceil
@@ -159,21 +165,13 @@ def transform_role(query):
     query = query.lower()
     if query == "staff":
         return Q(is_staff=True)
-    elif query == "editor":
-        return Q(is_staff=False) & Q(groups__name__in=[EDITOR_GROUP])
-    elif query == "copyeditor":
-        return (
-            Q(is_staff=False)
-            & ~Q(groups__name__in=[EDITOR_GROUP])
-            & Q(groups__name__in=[COPYEDITOR_GROUP])
-        )
-    elif query == "contributor":
-        return (
-            Q(is_staff=False)
-            & ~Q(groups__name__in=[EDITOR_GROUP])
-            & ~Q(groups__name__in=[COPYEDITOR_GROUP])
-            & Q(groups__name__in=[CONTRIBUTOR_GROUP])
-        )
+    elif query in ("editor", "copyeditor", "contributor"):
+        role = {
+            "editor": EDITOR_GROUP,
+            "copyeditor": COPYEDITOR_GROUP,
+            "contributor": CONTRIBUTOR_GROUP,
+        }[query]
+        return Q(is_staff=False) & Q(role=role)
     else:
         # return an empty queryset
         return Q(pk__in=[])
@@ -190,6 +188,13 @@ class UserViewSet(ModelViewSet):
         "role": transform_role,
         "is": transform_role,
     }
+    sort_fields = {
+        "username": ("username",),
+        "first_name": ("first_name",),
+        "last_name": ("last_name",),
+        "writer_name": ("writer_name",),
+        "email": ("email",),
+    }
     lookup_field = "username"
 
     def create(self, request, *args, **kwargs):
@@ -251,6 +256,56 @@ class UserViewSet(ModelViewSet):
             raise ValidationError({"username": ["USER.USERNAME.TOO_LONG"]})
         return Response(None)
 
+    @action(detail=False, methods=["POST"], url_path="import")
+    def bulk_import(self, request):
+        """Creates many users at once, e.g. a term's new contributors. Takes a list of users like create does under
+        `users`. Either every user is created, or, if any user is invalid, none are.
+        """
+        users = request.data.get("users")
+        if not isinstance(users, list) or not len(users):
+            raise ValidationError({"users": ["USER.IMPORT.EMPTY"]})
+        if any(
+            isinstance(user, dict)
+            and user.get("role", CONTRIBUTOR_GROUP) != CONTRIBUTOR_GROUP
+            for user in users
+        ):
+            confirm_password(request)
+
+        serializer = UserSerializer(data=users, many=True)
+        # Usernames are checked against the database all at once below, rather than with a query for each user
+        username_field = serializer.child.fields["username"]
+        username_field.validators = [
+            validator
+            for validator in username_field.validators
+            if not isinstance(validator, UniqueValidator)
+        ]
+        serializer.is_valid()
+        errors = serializer.errors or [{} for _ in users]
+
+        usernames = [
+            user.get("username", "") if isinstance(user, dict) else "" for user in users
+        ]
+        taken = set(
+            SluglineUser.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        seen = set()
+        for username, user_errors in zip(usernames, errors):
+            if username in taken or username in seen:
+                user_errors["username"] = ["USER.USERNAME.ALREADY_EXISTS"]
+            elif username.lower() in FORBIDDEN_USERNAMES:
+                user_errors["username"] = ["USER.USERNAME.ALREADY_EXISTS"]
+            seen.add(username)
+        if any(errors):
+            raise ValidationError({"users": errors})
+
+        created = create_users(serializer.validated_data)
+        return Response(
+            status=status.HTTP_201_CREATED,
+            data=UserSerializer(created, many=True).data,
+        )
+
     @action(detail=True, methods=["POST"])
     def reset_password(self, request, username=None):
         try: